@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""Times importing a large synthetic mesh with Mesh.load_from_assimp.
+
+For comparison, this also times the per-vertex transform loop that mesh importing
+used to run.  Run as ``python benchmarks/mesh_import.py [vertices]``.
+"""
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from dent.Mesh import Mesh
+
+
+def synthetic_mesh(vertices):
+    random = np.random.RandomState(0)
+    return SimpleNamespace(
+        vertices=random.rand(vertices, 3).astype(np.float32),
+        normals=random.rand(vertices, 3).astype(np.float32),
+        tangents=random.rand(vertices, 3).astype(np.float32),
+        bitangents=random.rand(vertices, 3).astype(np.float32),
+        texturecoords=[random.rand(vertices, 3).astype(np.float32)],
+        faces=random.randint(0, vertices, (vertices, 3)).astype(np.uint32),
+        bones=[],
+        material=SimpleNamespace(properties={("name", 0): "material"}),
+    )
+
+
+def per_vertex_transform(transform, vertices, normals):
+    """The transform loop mesh importing used before it was vectorized."""
+    vertex_positions = np.append(
+        vertices, np.ones((len(vertices), 1), dtype=np.float32), axis=1
+    )
+    vertex_normals = np.append(
+        normals, np.zeros((len(normals), 1), dtype=np.float32), axis=1
+    )
+    tinvtrans = np.linalg.inv(transform).transpose()
+    for i in range(len(vertex_positions)):
+        vertex_positions[i] = transform.dot(vertex_positions[i])
+        vertex_normals[i] = tinvtrans.dot(vertex_normals[i])
+    return vertex_positions[:, 0:3], vertex_normals[:, 0:3]
+
+
+def main(vertices):
+    assimp_mesh = synthetic_mesh(vertices)
+    transform = np.eye(4)
+    transform[:3, 3] = (1, 2, 3)
+
+    start = time.time()
+    per_vertex_transform(transform, assimp_mesh.vertices, assimp_mesh.normals)
+    looped = time.time() - start
+
+    start = time.time()
+    Mesh("benchmark", transform).load_from_assimp(assimp_mesh, "", None, None)
+    vectorized = time.time() - start
+
+    print("{} vertices".format(vertices))
+    print("  per-vertex transform loop: {:8.3f}s".format(looped))
+    print("  load_from_assimp:          {:8.3f}s".format(vectorized))
+    print("  speedup:                   {:8.1f}x".format(looped / vectorized))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
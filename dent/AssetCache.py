@@ -0,0 +1,75 @@
+import logging
+import threading
+from collections import OrderedDict
+
+
+class AssetCache(object):
+    """A least recently used cache of loaded assets, bounded by a byte budget.
+
+    Each entry is stored with a size in bytes (for assets, the size of the file they
+    were loaded from).  When the total size exceeds the budget, the least recently
+    used entries are evicted.  An entry larger than the whole budget is never cached.
+
+    The cache keeps running counts of hits, misses and evictions, as well as the
+    number of bytes currently held.  It is safe to use from several threads.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key`, marking it as recently used."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, size):
+        """Caches `value` under `key`, evicting older entries if required."""
+        with self._lock:
+            self._remove(key)
+            if size > self.budget:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            self._evict()
+
+    def invalidate(self, key=None):
+        """Drops `key` from the cache, or every entry if no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.bytes = 0
+            else:
+                self._remove(key)
+
+    def set_budget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def _remove(self, key):
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+
+    def _evict(self):
+        while self.bytes > self.budget:
+            key, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            logging.debug("Evicted {} ({} bytes) from asset cache".format(key, size))
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class AssetIndex(object):
+    """A persistent index of the assets held in an asset store.
+
+    The index is an append-only log with one JSON record per line.  Each record
+    describes one asset (its internal ID, name, type, size and so forth) and replaces
+    any earlier record for the same ID; a record with ``"deleted": true`` removes the
+    asset.  Appending a single line is atomic, so readers (including other
+    processes) only ever see whole records.  A torn final line from an interrupted
+    write is ignored.
+
+    The whole index is held in memory, so lookups by ID do not touch the disk.  If
+    an ID is not found, any records appended since the log was last read are loaded
+    before giving up.
+
+    Compaction replaces the log with a new file.  It holds a lock on the index (shared
+    by appends, where `fcntl` is available) so that no process appends to the old
+    log meanwhile, and readers notice the new file and read it from the start.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._records = {}
+        self._offset = 0
+        # The inode of the log as last read, which changes when it is compacted
+        self._inode = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @contextmanager
+    def _file_lock(self, exclusive=False):
+        """Holds the lock of the index among processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.filename + ".lock", "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Reads any records appended to the log since it was last read."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                # The log is new (or has been compacted), so is read from the start
+                self._records = {}
+                self._offset = 0
+                self._inode = stat.st_ino
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._offset += len(line)
+                try:
+                    self._apply(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    logging.warning("Corrupt record in asset index %s", self.filename)
+
+    def _apply(self, record):
+        if record.get("deleted"):
+            self._records.pop(record["id"], None)
+        else:
+            self._records[record["id"]] = record
+
+    def _append(self, record):
+        line = (json.dumps(record, sort_keys=True) + "\n").encode("utf-8")
+        with self._lock, self._file_lock():
+            with open(self.filename, "ab") as f:
+                f.write(line)
+                inode = os.fstat(f.fileno()).st_ino
+                size = f.tell()
+            self._apply(record)
+            if inode == self._inode and self._offset == size - len(line):
+                self._offset += len(line)
+
+    def get(self, asset_id):
+        """Returns the record for an asset, or None if it is not in the store."""
+        if asset_id not in self._records:
+            self.refresh()
+        return self._records.get(asset_id)
+
+    def add(self, record):
+        """Adds (or replaces) the record for the asset ``record["id"]``."""
+        self._append(record)
+
+    def update(self, asset_id, **fields):
+        """Changes some fields of an existing record."""
+        record = dict(self._records[asset_id])
+        record.update(fields)
+        self._append(record)
+
+    def remove(self, asset_id):
+        self._append({"id": asset_id, "deleted": True})
+
+    def ids(self):
+        return sorted(self._records)
+
+    def records(self):
+        return list(self._records.values())
+
+    def compact(self):
+        """Rewrites the log with only the current record for each asset."""
+        with self._lock, self._file_lock(exclusive=True):
+            # No other process can append now, so this reads the whole log
+            self._refresh()
+            temporary = self.filename + ".tmp"
+            with open(temporary, "wb") as f:
+                for asset_id in sorted(self._records):
+                    f.write(
+                        (
+                            json.dumps(self._records[asset_id], sort_keys=True) + "\n"
+                        ).encode("utf-8")
+                    )
+                self._inode = os.fstat(f.fileno()).st_ino
+                self._offset = f.tell()
+            os.replace(temporary, self.filename)
+
+    def __contains__(self, asset_id):
+        return self.get(asset_id) is not None
+
+    def __len__(self):
+        return len(self._records)
@@ -0,0 +1,103 @@
+import json
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# An asset pack is a header, followed by the (aligned) payloads of its assets and
+# finally a JSON table of contents.  The header holds the magic string, the format
+# version, and the offset and size of the table of contents.
+PACK_MAGIC = b"DENTPACK"
+PACK_VERSION = 1
+_PACK_HEADER = struct.Struct("<8sIQQ")
+_PACK_ALIGNMENT = 64
+
+CODECS = {
+    "raw": (lambda data: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+class AssetPack(object):
+    """A single file holding many assets, read through a memory map.
+
+    Each entry of the pack is found by internal asset ID in the table of contents,
+    which records where its payload lies, the codec the payload is stored with and
+    the asset's index record.  Payloads are aligned, so an uncompressed (``"raw"``)
+    entry can be used in place without copying.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._buffer = np.memmap(filename, dtype=np.uint8, mode="r")
+        if len(self._buffer) < _PACK_HEADER.size:
+            raise IOError("Truncated asset pack {}".format(filename))
+        magic, version, toc_offset, toc_size = _PACK_HEADER.unpack_from(
+            self._buffer, 0
+        )
+        if magic != PACK_MAGIC:
+            raise IOError("{} is not an asset pack".format(filename))
+        if version != PACK_VERSION:
+            raise IOError("Unsupported asset pack version {}".format(version))
+        self.entries = json.loads(
+            bytes(self._buffer[toc_offset : toc_offset + toc_size]).decode("utf-8")
+        )
+
+    def get(self, asset_id):
+        """Returns the table of contents entry for an asset, or None."""
+        return self.entries.get(asset_id)
+
+    def read(self, asset_id):
+        """Returns the payload of an asset as an array of bytes."""
+        entry = self.entries[asset_id]
+        data = self._buffer[entry["offset"] : entry["offset"] + entry["stored_size"]]
+        if entry["codec"] == "raw":
+            return data
+        return np.frombuffer(CODECS[entry["codec"]][1](data), dtype=np.uint8)
+
+    def __contains__(self, asset_id):
+        return asset_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def write_pack(filename, assets, codec="raw"):
+    """Writes an asset pack.
+
+    `assets` is an iterable of ``(asset_id, payload, record)`` tuples, where the
+    payload is a bytes-like object and the record is the asset's index record.
+    `codec` names the codec to store each payload with, or is a function choosing one
+    from the record.  The pack is written to a temporary file and then moved into
+    place, so readers never see a partial pack.
+    """
+    temporary = filename + ".tmp"
+    entries = {}
+    with open(temporary, "wb") as f:
+        f.write(b"\0" * _PACK_HEADER.size)
+        for asset_id, payload, record in assets:
+            entry_codec = codec(record) if callable(codec) else codec
+            stored = CODECS[entry_codec][0](bytes(payload))
+            offset = _aligned(f.tell())
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(stored)
+            entries[asset_id] = {
+                "offset": offset,
+                "stored_size": len(stored),
+                "size": len(payload),
+                "codec": entry_codec,
+                "record": record,
+            }
+        toc = json.dumps(entries, sort_keys=True).encode("utf-8")
+        toc_offset = f.tell()
+        f.write(toc)
+        f.seek(0)
+        f.write(_PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, toc_offset, len(toc)))
+    os.replace(temporary, filename)
+
+
+def _aligned(offset):
+    return (offset + _PACK_ALIGNMENT - 1) // _PACK_ALIGNMENT * _PACK_ALIGNMENT
@@ -0,0 +1,91 @@
+import threading
+from collections import namedtuple
+
+AssetTotal = namedtuple(
+    "AssetTotal", ("name", "action", "origin", "type", "count", "seconds", "size")
+)
+
+
+class AssetStats(object):
+    """A record of the time and bytes spent loading and saving assets.
+
+    Each event notes the asset's name, whether it was loaded or saved, where it came
+    from (``"cache"``, ``"file"``, ``"pack"`` or ``"generator"``, or ``"explicit"``
+    for assets saved directly), its type and how long it took.  Events are totalled
+    per asset, action and origin in `totals`, so that a long running game does not
+    keep them all.  The size of an asset loaded from the cache does not count
+    towards the bytes read.  It is safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, action, origin, asset_type, seconds, size=0):
+        with self._lock:
+            total = self.totals.get((name, action, origin))
+            if total is None:
+                total = AssetTotal(name, action, origin, asset_type, 0, 0., 0)
+            self.totals[(name, action, origin)] = total._replace(
+                type=asset_type,
+                count=total.count + 1,
+                seconds=total.seconds + seconds,
+                size=total.size + size,
+            )
+
+    def reset(self):
+        with self._lock:
+            self.totals = {}
+
+    def bytes_read(self):
+        with self._lock:
+            totals = list(self.totals.values())
+        return sum(
+            total.size
+            for total in totals
+            if total.action == "load" and total.origin in ("file", "pack")
+        )
+
+    def report(self, count=10):
+        """Summarises the events, listing the `count` slowest assets."""
+        with self._lock:
+            totals = list(self.totals.values())
+        lines = ["Asset I/O report", ""]
+        lines.append(
+            "{:10} {:10} {:>7} {:>10} {:>12}".format(
+                "Action", "Origin", "Count", "Seconds", "Bytes"
+            )
+        )
+        groups = {}
+        for total in totals:
+            groups.setdefault((total.action, total.origin), []).append(total)
+        for (action, origin), group in sorted(groups.items()):
+            lines.append(
+                "{:10} {:10} {:7} {:10.3f} {:12}".format(
+                    action,
+                    origin,
+                    sum(total.count for total in group),
+                    sum(total.seconds for total in group),
+                    sum(total.size for total in group),
+                )
+            )
+        lines.append("")
+        lines.append(
+            "{:>10} {:16} {:10} {:>7} {:>12}  {}".format(
+                "Seconds", "Origin", "Type", "Count", "Bytes", "Asset"
+            )
+        )
+        for total in sorted(totals, key=lambda total: -total.seconds)[:count]:
+            lines.append(
+                "{:10.3f} {:16} {:10} {:7} {:12}  {}".format(
+                    total.seconds,
+                    "{} {}".format(total.action, total.origin),
+                    total.type,
+                    total.count,
+                    total.size,
+                    total.name,
+                )
+            )
+        lines.append("")
+        lines.append("Total bytes read: {}".format(self.bytes_read()))
+        return "\n".join(lines)
@@ -4,6 +4,7 @@ from . import messaging
 import dent.keyboard
 import dent.inputs
 from .Shaders import *
+from .SceneGraph import as_node
 
 class Camera(object):
   def __init__(
@@ -42,6 +43,11 @@ class Camera(object):
     self.globalRight = np.array([0.0,0.0,1.0])
 
     self.direction = np.array([0.,0.,1.])
+    # The scene graph node this camera is attached to, if any
+    self.node = None
+    # The projection matrix this camera is drawn with, used to cull what it cannot
+    # see.  Nothing is culled if this is None.
+    self.projection = None
     self.update()
 
   def move(self,d):
@@ -78,7 +84,33 @@ class Camera(object):
 
     self.direction = np.array([0,0,-1])
     self.direction = self.view[:3,:3].dot(self.direction)
-
+    if self.node is not None:
+      self.node.invalidate()
+
+  def local_matrix(self):
+    """The transform from this camera's space to its parent's."""
+    return np.linalg.inv(self.view)
+
+  def add_to_graph(self, graph):
+    """Adds this camera to the root of a scene graph, so that objects can be
+    attached to it."""
+    if self.node is None:
+      self.node = graph.add_node(local_function=self.local_matrix)
+
+  def attach(self, parent):
+    """Attaches this camera to a scene graph node, or to an object in a scene
+    graph, so that it moves with it.  Its position and direction are then relative
+    to the parent."""
+    parent = as_node(parent)
+    if self.node is None:
+      self.add_to_graph(parent.graph)
+    self.node.parent = parent
+
+  def world_view(self):
+    """The view matrix, taking world space to this camera's space."""
+    if self.node is None:
+      return self.view
+    return np.linalg.inv(self.node.world).astype(np.float32)
 
 
   def render(self, name=''):
@@ -86,9 +118,15 @@ class Camera(object):
     `{name}CameraDirection` and `{name}CameraPosition` for a given name.  This
     allows for multiple cameras to be "rendered" simultaniously."""
     self.update()
-    updateUniversalUniform(name+'View',self.view.T)
-    updateUniversalUniform(name+'CameraDirection',self.direction.copy())
-    updateUniversalUniform(name+'CameraPosition',self.position.copy())
+    direction = self.direction.copy()
+    position = self.position.copy()
+    if self.node is not None:
+      world = self.node.world
+      direction = -world[2,:3] / np.linalg.norm(world[2,:3])
+      position = world[3,:3].copy()
+    updateUniversalUniform(name+'View',self.world_view().T)
+    updateUniversalUniform(name+'CameraDirection',direction)
+    updateUniversalUniform(name+'CameraPosition',position)
 
 
 class MouseControlledCamera(Camera):
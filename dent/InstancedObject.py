@@ -4,6 +4,7 @@ import logging
 import numpy as np
 from . import Shaders
 from . import Texture
+from .SceneGraph import world_matrices
 
 rendered = set()
 
@@ -17,6 +18,8 @@ class InstancedObject(Object.Object):
     self.shader['colormap']  = Texture.COLORMAP_NUM
     self.shader['normalmap'] = Texture.NORMALMAP_NUM
     self.shader['bumpmap'] = Texture.BUMPMAP_NUM
+    # The world matrix of this object's node when the instances were last uploaded
+    self._uploaded_world = None
 
   def uploadMesh(self, mesh):
     """Intercepted so that we can do the whole instancing thing."""
@@ -25,15 +28,22 @@ class InstancedObject(Object.Object):
   def display(self, offset=0, num=None):
     if num is None:
       num = len(self)
+    if self.node is not None and self.renderIDs:
+      if not np.array_equal(self.node.world, self._uploaded_world):
+        self.refreeze()
     self.shader.load()
     options = None
 
     for material in list(self.materials.values()):
         material.set_uniforms(self.shader)
-        for mesh in self.meshes_per_material[material.name]:
+        for mesh in self.meshes_per_material.get(material.name, ()):
             if mesh.name in self.renderIDs:
                 self.shader.draw(gl.GL_TRIANGLES, self.renderIDs[mesh.name], num, offset)
 
+  # Instances are drawn with their own draw call, so are not put in a render queue.
+  # Scenes draw them after submitting their queue.
+  queue_draws = None
+
   def __len__(self):
     return len(self.instances)
 
@@ -41,12 +51,24 @@ class InstancedObject(Object.Object):
     self.instances = np.append(self.instances, data)
     logging.info("Adding {} instances".format(len(data)))
 
+  def world_instances(self):
+    """The instances, with their model matrices taken to world space by this
+    object's scene graph node (see `attach`), if it has one."""
+    if self.node is None:
+      return self.instances
+    instances = self.instances.copy()
+    instances["model"] = world_matrices(self.instances["model"], self.node)
+    self._uploaded_world = np.array(self.node.world)
+    return instances
+
   def freeze(self):
     logging.info("Freezing {}".format(self))
+    instances = self.world_instances()
     for mesh in self.meshes:
-      self.renderIDs[mesh.name] = self.shader.setData(*self.md[mesh.name], self.instances)
+      self.renderIDs[mesh.name] = self.shader.setData(*self.md[mesh.name], instances)
 
   def refreeze(self):
+    instances = self.world_instances()
     for renderid in self.renderIDs.values():
       gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.shader.objInfo[renderid].instbo)
-      gl.glBufferData(gl.GL_ARRAY_BUFFER, self.instances.nbytes, self.instances, gl.GL_STREAM_DRAW)
+      gl.glBufferData(gl.GL_ARRAY_BUFFER, instances.nbytes, instances, gl.GL_STREAM_DRAW)
@@ -0,0 +1,98 @@
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future
+
+from dent import messaging
+from dent import taskQueue
+
+
+class LoaderPool(object):
+    """A bounded pool of worker threads that run loading jobs by priority.
+
+    Jobs are submitted with a priority (higher runs sooner; equal priorities run in
+    the order submitted) and return a :class:`concurrent.futures.Future`.  A job that
+    has not yet started can be cancelled through its future.  If a job is given a
+    callback, the callback is called with the job's result on the main thread (by
+    way of :mod:`dent.taskQueue`), which makes it a safe place for OpenGL calls such
+    as uploading a loaded mesh.
+
+    Progress is posted as :mod:`dent.messaging` events (which are not recorded for
+    replays, as loading times differ between runs), for loading screens.  As each
+    job finishes (or is cancelled), a ``"loading_progress"`` message is posted with
+    the number of jobs finished and submitted; both counts go back to zero once
+    every job has finished.  Jobs given a name also post a ``"loaded"`` or
+    ``"load_failed"`` message with that name.
+
+    Worker threads are only started when there is work for them, so constructing a
+    pool is cheap.
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._jobs = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self.submitted = 0
+        self.finished = 0
+
+    def submit(self, function, args=(), priority=0, callback=None, name=None):
+        """Schedules `function(*args)`, returning a future for its result."""
+        future = Future()
+        future.add_done_callback(lambda future: self._post_progress(future, name))
+        if callback is not None:
+            future.add_done_callback(
+                lambda future: self._post_callback(future, callback)
+            )
+        with self._condition:
+            heapq.heappush(
+                self._jobs, (-priority, next(self._counter), future, function, args)
+            )
+            self.submitted += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name="dent-loader")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._condition.notify()
+        return future
+
+    def _post_progress(self, future, name):
+        with self._condition:
+            self.finished += 1
+            progress = (self.finished, self.submitted)
+            if self.finished == self.submitted:
+                self.finished = self.submitted = 0
+        if name is not None:
+            failed = future.cancelled() or future.exception() is not None
+            messaging.add_event(
+                messaging.Message("load_failed" if failed else "loaded", (name,))
+            )
+        messaging.add_event(messaging.Message("loading_progress", progress))
+
+    def _post_callback(self, future, callback):
+        if future.cancelled() or future.exception() is not None:
+            return
+        taskQueue.addToMainThreadQueue(callback, (future.result(),))
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._jobs:
+                    self._condition.wait()
+                _, _, future, function, args = heapq.heappop(self._jobs)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(*args)
+            except BaseException as e:
+                logging.exception("Loading job {} failed".format(function))
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def __len__(self):
+        """The number of jobs waiting to run."""
+        return len(self._jobs)
@@ -91,6 +91,19 @@ class Material(object):
         self._specular_texture.loadAs(dent.Texture.SPECULARMAP)
         self._metallic_texture.loadAs(dent.Texture.METALLICMAP)
 
+    def texture_paths(self):
+        """Lists the paths of the texture files used by this material."""
+        return [
+            os.path.join(self.directory, filename)
+            for filename in (
+                self.diffuse_texture_file,
+                self.normal_texture_file,
+                self.specular_texture_file,
+                self.metallic_texture_file,
+            )
+            if filename
+        ]
+
     def load_textures(self):
         if self.diffuse_texture_file:
             self._diffuse_texture = dent.TextureManager.get_texture(
@@ -170,7 +183,6 @@ class Material(object):
         material.metallic_tint = config["metallic_tint"]
         material.specular_tint = config["specular_tint"]
         material.roughness_tint = config["roughness_tint"]
-        material.load_textures()
 
         return material
 
@@ -1,22 +1,132 @@
 import numpy as np
 import yaml
 import io
+import struct
 import tarfile
 
+# The binary mesh asset format is a fixed header, followed by a YAML config block
+# and then the raw vertex and index arrays, each aligned so that they can be
+# memory mapped directly.  The header is the magic string, the format version, the
+# config length and the offsets and sizes of the vertex and index blocks.
+BINARY_MAGIC = b"DENTMESH"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<8sIIQQQQ")
+_BINARY_ALIGNMENT = 64
 
-def get_node_parent(scene, name):
-    def dfs(node, parent):
-        if node.name == name:
-            return parent
 
-        for i in node.children:
-            a = dfs(i, node)
-            if a:
-                return a
+def _aligned(offset):
+    return (offset + _BINARY_ALIGNMENT - 1) // _BINARY_ALIGNMENT * _BINARY_ALIGNMENT
 
-        return None
 
-    return dfs(scene.rootnode, "")
+def _dtype_to_config(dtype):
+    """Describes a (structured) dtype in YAML-safe terms."""
+    if dtype.names is None:
+        return {"format": dtype.str}
+    return {
+        "names": list(dtype.names),
+        "formats": [dtype[name].base.str for name in dtype.names],
+        "shapes": [list(dtype[name].shape) for name in dtype.names],
+        "offsets": [dtype.fields[name][1] for name in dtype.names],
+        "itemsize": dtype.itemsize,
+    }
+
+
+def _dtype_from_config(config):
+    if "names" not in config:
+        return np.dtype(config["format"])
+    return np.dtype(
+        {
+            "names": config["names"],
+            "formats": [
+                (fmt, tuple(shape))
+                for fmt, shape in zip(config["formats"], config["shapes"])
+            ],
+            "offsets": config["offsets"],
+            "itemsize": config["itemsize"],
+        }
+    )
+
+
+def transform_vectors(transform, vectors, w=1.0):
+    """Applies a 4x4 transform to an array of 3-vectors.
+
+    Each vector is extended with the homogeneous component `w` (1 for positions, 0
+    for directions) and the last component of the result is dropped."""
+    homogeneous = np.empty((len(vectors), 4), dtype=np.float64)
+    homogeneous[:, :3] = vectors
+    homogeneous[:, 3] = w
+    return homogeneous.dot(np.transpose(transform))[:, :3]
+
+
+def get_node_parents(scene):
+    """Maps the name of each node in a scene to the name of its parent.
+
+    The root node's parent is given as the empty string."""
+    parents = {}
+    stack = [(scene.rootnode, "")]
+    while stack:
+        node, parent = stack.pop()
+        parents.setdefault(node.name, parent)
+        stack.extend((child, node.name) for child in reversed(node.children))
+    return parents
+
+
+def pack_bone_weights(vertex_count, vertex_ids, bone_ids, weights, slots=4, unused=59):
+    """Packs (vertex, bone, weight) triples into per vertex bone and weight slots.
+
+    Each vertex keeps its `slots` heaviest bones, with the weights renormalised to sum
+    to one.  Unused slots have bone `unused` and weight zero.  Returns arrays of bone
+    IDs and weights, each of shape ``(vertex_count, slots)``."""
+    vertex_ids = np.asarray(vertex_ids, dtype=np.int64)
+    bone_ids = np.asarray(bone_ids, dtype=np.int32)
+    weights = np.asarray(weights, dtype=np.float32)
+
+    # Sort by vertex and then by decreasing weight, and rank each triple within
+    # its vertex.
+    order = np.lexsort((-weights, vertex_ids))
+    vertex_ids, bone_ids, weights = vertex_ids[order], bone_ids[order], weights[order]
+    rank = np.arange(len(vertex_ids)) - np.searchsorted(vertex_ids, vertex_ids)
+    keep = rank < slots
+
+    packed_bone_ids = np.full((vertex_count, slots), unused, dtype=np.int32)
+    packed_weights = np.zeros((vertex_count, slots), dtype=np.float32)
+    packed_bone_ids[vertex_ids[keep], rank[keep]] = bone_ids[keep]
+    packed_weights[vertex_ids[keep], rank[keep]] = weights[keep]
+
+    totals = packed_weights.sum(axis=1, keepdims=True)
+    np.divide(packed_weights, totals, out=packed_weights, where=totals > 0)
+    return packed_bone_ids, packed_weights
+
+
+def narrow_indices(indices, vertex_count):
+    """Stores indices in 16 bits if there are few enough vertices, and 32 otherwise."""
+    index_type = np.uint16 if vertex_count <= 2 ** 16 else np.uint32
+    return np.asarray(indices).astype(index_type, copy=False)
+
+
+def merge_meshes(meshes, name):
+    """Merges meshes with the same vertex layout into a single mesh.
+
+    The vertex data are concatenated, and the indices of each mesh offset to match.
+    As mesh data is already transformed, the merged mesh has the identity transform.
+    It keeps the material of the meshes if they all share one, and otherwise has
+    none."""
+    data = np.concatenate([mesh.data for mesh in meshes])
+    offsets = np.cumsum([0] + [len(mesh.data) for mesh in meshes[:-1]])
+    indices = np.concatenate(
+        [
+            np.asarray(mesh.indices, dtype=np.uint32) + np.uint32(offset)
+            for mesh, offset in zip(meshes, offsets)
+        ]
+    )
+    merged = Mesh(name, np.eye(4), np.zeros(3), meshes[0].directory)
+    merged.data = data
+    merged.indices = narrow_indices(indices, len(data))
+    materials = set(mesh.material_name for mesh in meshes)
+    if len(materials) == 1:
+        merged.material_name = materials.pop()
+    merged.compute_bounds()
+    return merged
 
 
 class Mesh(object):
@@ -30,6 +140,8 @@ class Mesh(object):
     using the dent asset manager.
     """
 
+    _dent_asset_magic = BINARY_MAGIC
+
     def __init__(self, name, transform=np.eye(4), offset=np.zeros(3), directory=""):
         self.name = name
         self.directory = directory
@@ -38,6 +150,13 @@ class Mesh(object):
         self._transform = transform
         self.offset = offset
         self.material_name = None
+        # Set for meshes with normalised integer positions (see dent.vertexformat)
+        self.position_scale = None
+        self.position_offset = None
+        # The min and max corners of the axis aligned bounding box, and the centre
+        # and radius of a bounding sphere.  These are set when the mesh is built.
+        self.bounds = None
+        self.bounding_sphere = None
 
     def load_from_assimp(self, assimp_mesh, directory, scene, parent):
         """Load this mesh from an assimp mesh."""
@@ -54,23 +173,13 @@ class Mesh(object):
             ],
         )
 
-        # Get the vertex positions and add a w=1 component
-        vertex_positions = assimp_mesh.vertices
-        add = np.ones((vertex_positions.shape[0], 1), dtype=np.float32)
-        vertex_positions = np.append(vertex_positions, add, axis=1)
-        # Get the vertex normals and add a w=1 component
-        vertex_normals = assimp_mesh.normals
-        add = np.zeros((vertex_normals.shape[0], 1), dtype=np.float32)
-        vertex_normals = np.append(vertex_normals, add, axis=1)
-
+        # Transform the positions (with w=1) and the normals (with w=0, by the
+        # inverse transpose)
         tinvtrans = np.linalg.inv(self._transform).transpose()
-        # Transform all the vertex positions.
-        for i in range(len(vertex_positions)):
-            vertex_positions[i] = self._transform.dot(vertex_positions[i])
-            vertex_normals[i] = tinvtrans.dot(vertex_normals[i])
-        # Splice correctly, killing last components
-        vertex_positions = vertex_positions[:, 0:3] - self.offset
-        vertex_normals = vertex_normals[:, 0:3]
+        vertex_positions = (
+            transform_vectors(self._transform, assimp_mesh.vertices) - self.offset
+        )
+        vertex_normals = transform_vectors(tinvtrans, assimp_mesh.normals, 0)
 
         vertex_uvs = assimp_mesh.texturecoords[0][:, [0, 1]]
         vertex_uvs[:, 1] = 1 - vertex_uvs[:, 1]
@@ -85,48 +194,120 @@ class Mesh(object):
         self.data["weights"] = 0
 
         # Get the triangle indices in a flat array.
-        self.indices = assimp_mesh.faces.reshape((-1,))
+        self.indices = narrow_indices(
+            assimp_mesh.faces.reshape((-1,)), len(self.data)
+        )
 
         if len(assimp_mesh.bones) > 0:
+            node_parents = get_node_parents(scene)
+            vertex_ids, bone_ids, weights = [], [], []
             for bone in assimp_mesh.bones:
-                n = len(parent.bones)
                 if bone.name not in parent.bones:
                     parent.bones[bone.name] = (
-                        n,
-                        get_node_parent(scene, bone.name).name,
+                        len(parent.bones),
+                        node_parents.get(bone.name),
                         bone.offsetmatrix,
                     )
-                    nn = n
-                else:
-                    nn = parent.bones[bone.name][0]
-                for relationship in bone.weights:
-                    bone_vec_number = 0
-                    for i in range(3):
-                        if (
-                            self.data["weights"][relationship.vertexid][bone_vec_number]
-                            > 0
-                        ):
-                            bone_vec_number += 1
-                        else:
-                            break
-
-                    self.data["weights"][relationship.vertexid][
-                        bone_vec_number
-                    ] = relationship.weight
-                    self.data["bone_ids"][relationship.vertexid][bone_vec_number] = nn
+                bone_weights = bone.weights
+                vertex_ids.append(
+                    np.fromiter(
+                        (i.vertexid for i in bone_weights),
+                        dtype=np.int64,
+                        count=len(bone_weights),
+                    )
+                )
+                weights.append(
+                    np.fromiter(
+                        (i.weight for i in bone_weights),
+                        dtype=np.float32,
+                        count=len(bone_weights),
+                    )
+                )
+                bone_ids.append(
+                    np.full(len(bone_weights), parent.bones[bone.name][0], np.int32)
+                )
+            self.data["bone_ids"], self.data["weights"] = pack_bone_weights(
+                len(self.data),
+                np.concatenate(vertex_ids),
+                np.concatenate(bone_ids),
+                np.concatenate(weights),
+            )
 
         self.material_name = assimp_mesh.material.properties[("name", 0)]
+        self.compute_bounds()
 
     def union(self, other) -> "Mesh":
         """Construct the union of this mesh with another.
 
-        Currently this forgets all materials etc. and is simply an action on sets of
-        triangles.
+        This is simply an action on sets of triangles (see `merge_meshes`).
         """
-        mesh = Mesh("{}|{}".format(self.name, other.name))
-        mesh.data = np.concatenate((self.data, other.data))
-        mesh.indices = np.concatenate((self.indices, other.indices + len(self.data)))
-        return mesh
+        return merge_meshes([self, other], "{}|{}".format(self.name, other.name))
+
+    def _dent_asset_metadata(self):
+        """Describes this mesh for the asset store index."""
+        metadata = {"vertices": len(self.data), "indices": len(self.indices)}
+        metadata.update(self._bounds_config())
+        return metadata
+
+    def compute_bounds(self):
+        """Computes the bounding box and bounding sphere of this mesh.
+
+        The sphere is centred on the middle of the box, which is not the smallest
+        sphere, but close to it and cheap to find."""
+        if (
+            self.data is None
+            or len(self.data) == 0
+            or "position" not in self.data.dtype.names
+        ):
+            self.bounds = None
+            self.bounding_sphere = None
+            return
+        positions = self.positions()
+        self.bounds = np.array([positions.min(axis=0), positions.max(axis=0)])
+        centre = self.bounds.mean(axis=0)
+        radius = np.sqrt(((positions - centre) ** 2).sum(axis=1).max())
+        self.bounding_sphere = (centre, float(radius))
+
+    def _bounds_config(self):
+        if self.bounds is None:
+            self.compute_bounds()
+        if self.bounds is None:
+            return {}
+        centre, radius = self.bounding_sphere
+        return {
+            "bounds": self.bounds.tolist(),
+            "bounding_sphere": centre.tolist() + [radius],
+        }
+
+    def _load_bounds_config(self, config):
+        """Reads the bounds saved with this mesh, or computes them for assets saved
+        without."""
+        if config.get("bounds") is None:
+            self.compute_bounds()
+            return
+        self.bounds = np.array(config["bounds"])
+        sphere = config["bounding_sphere"]
+        self.bounding_sphere = (np.array(sphere[:3]), float(sphere[3]))
+
+    def positions(self):
+        """The vertex positions of this mesh, as floats, whatever their layout."""
+        positions = self.data["position"][:, :3].astype(np.float64)
+        if self.position_scale is not None:
+            positions = positions / 32767 * self.position_scale + self.position_offset
+        return positions
+
+    def _quantization_config(self):
+        if self.position_scale is None:
+            return {}
+        return {
+            "position_scale": np.asarray(self.position_scale).tolist(),
+            "position_offset": np.asarray(self.position_offset).tolist(),
+        }
+
+    def _load_quantization_config(self, config):
+        if config.get("position_scale") is not None:
+            self.position_scale = np.array(config["position_scale"])
+            self.position_offset = np.array(config["position_offset"])
 
     @staticmethod
     def _dent_asset_load(datastore) -> "Mesh":
@@ -142,14 +323,104 @@ class Mesh(object):
         )
         mesh.indices = np.array(config["indices"])
         mesh.material_name = config["material_name"]
+        mesh._load_quantization_config(config)
         array_file = io.BytesIO()
         array_file.write(datastore.extractfile("data").read())
         array_file.seek(0)
         mesh.data = np.load(array_file)
+        mesh._load_bounds_config(config)
         return mesh
 
+    @staticmethod
+    def _dent_asset_load_binary(buffer) -> "Mesh":
+        """Load a mesh from a buffer in the binary mesh asset format.
+
+        The vertex and index arrays of the returned mesh are views onto `buffer`, so
+        if that is a memory map, no data is copied.
+        """
+        if len(buffer) < _BINARY_HEADER.size:
+            raise IOError("Truncated mesh asset")
+        (
+            magic,
+            version,
+            config_size,
+            data_offset,
+            data_size,
+            indices_offset,
+            indices_size,
+        ) = _BINARY_HEADER.unpack_from(buffer, 0)
+        if magic != BINARY_MAGIC:
+            raise IOError("Not a binary mesh asset")
+        if version != BINARY_VERSION:
+            raise IOError("Unsupported binary mesh asset version {}".format(version))
+
+        config_start = _BINARY_HEADER.size
+        config = yaml.safe_load(
+            bytes(buffer[config_start : config_start + config_size])
+        )
+        mesh = Mesh(
+            config["name"],
+            np.array(config["transform"]).reshape((4, 4)),
+            np.array(config["offset"]),
+            config["directory"],
+        )
+        mesh.material_name = config["material_name"]
+        mesh._load_quantization_config(config)
+        data_dtype = _dtype_from_config(config["data_dtype"])
+        indices_dtype = _dtype_from_config(config["indices_dtype"])
+        mesh.data = np.frombuffer(
+            buffer,
+            dtype=data_dtype,
+            count=data_size // data_dtype.itemsize,
+            offset=data_offset,
+        )
+        mesh.indices = np.frombuffer(
+            buffer,
+            dtype=indices_dtype,
+            count=indices_size // indices_dtype.itemsize,
+            offset=indices_offset,
+        )
+        mesh._load_bounds_config(config)
+        return mesh
+
+    def _dent_asset_save_binary(self, f):
+        """Save this mesh to a file object in the binary mesh asset format."""
+        data = np.ascontiguousarray(self.data)
+        indices = np.ascontiguousarray(self.indices)
+        config = {
+            "name": self.name,
+            "directory": self.directory,
+            "transform": np.asarray(self._transform).tolist(),
+            "offset": np.asarray(self.offset).tolist(),
+            "material_name": self.material_name,
+            "data_dtype": _dtype_to_config(data.dtype),
+            "indices_dtype": _dtype_to_config(indices.dtype),
+        }
+        config.update(self._quantization_config())
+        config.update(self._bounds_config())
+        config = yaml.safe_dump(config).encode("utf-8")
+
+        data_offset = _aligned(_BINARY_HEADER.size + len(config))
+        indices_offset = _aligned(data_offset + data.nbytes)
+        f.write(
+            _BINARY_HEADER.pack(
+                BINARY_MAGIC,
+                BINARY_VERSION,
+                len(config),
+                data_offset,
+                data.nbytes,
+                indices_offset,
+                indices.nbytes,
+            )
+        )
+        f.write(config)
+        f.write(b"\0" * (data_offset - _BINARY_HEADER.size - len(config)))
+        f.write(data.tobytes())
+        f.write(b"\0" * (indices_offset - data_offset - data.nbytes))
+        f.write(indices.tobytes())
+
     def _dent_asset_save(self, datastore):
-        """Save the image in this texture to a dent asset datastore."""
+        """Save this mesh to a dent asset datastore."""
         data_buffer = io.BytesIO()
         np.save(data_buffer, self.data)
         data_header = tarfile.TarInfo("data")
@@ -157,19 +428,18 @@ class Mesh(object):
         data_buffer.seek(0)
         datastore.addfile(data_header, data_buffer)
 
+        config = {
+            "name": self.name,
+            "directory": self.directory,
+            "transform": self._transform.tolist(),
+            "offset": self.offset.tolist(),
+            "indices": self.indices.tolist(),
+            "material_name": self.material_name,
+        }
+        config.update(self._quantization_config())
+        config.update(self._bounds_config())
         config_buffer = io.BytesIO()
-        config_buffer.write(
-            yaml.dump(
-                {
-                    "name": self.name,
-                    "directory": self.directory,
-                    "transform": self._transform.tolist(),
-                    "offset": self.offset.tolist(),
-                    "indices": self.indices.tolist(),
-                    "material_name": self.material_name,
-                }
-            ).encode("ascii")
-        )
+        config_buffer.write(yaml.dump(config).encode("ascii"))
         config_buffer.flush()
         config_header = tarfile.TarInfo("config")
         config_header.size = config_buffer.getbuffer().nbytes
@@ -6,6 +6,7 @@ from PIL import Image
 import os
 from . import Shaders
 from . import transforms
+from .Mesh import transform_vectors
 import OpenGL.GL as gl
 
 
@@ -60,21 +61,9 @@ class MultiObject(object):
                              ("normal"    , np.float32, 3),
                              ("textcoord" , np.float32, 2),
                              ("color"     , np.float32, 4)])
-    # Get the vertex positions and add a w=1 component
-    vertPos = mesh.vertices
-    add = np.zeros((vertPos.shape[0], 1), dtype=np.float32)+1
-    vertPos = np.append(vertPos,add,axis=1)
-    # Get the vertex normals and add a w=1 component
-    vertNorm = mesh.normals
-    add = np.zeros((vertNorm.shape[0], 1), dtype=np.float32)
-    vertNorm = np.append(vertNorm, add, axis=1)
-    # Transform all the vertex positions.
-    for i in range(len(vertPos)):
-      vertPos[i] = trans.dot(vertPos[i])
-      vertNorm[i] = trans.dot(vertNorm[i])
-    # Splice correctly
-    vertPos = vertPos[:, 0:3]
-    vertNorm = vertNorm[:, 0:3]
+    # Transform the vertex positions (with w=1) and normals (with w=0)
+    vertPos = transform_vectors(trans, mesh.vertices)
+    vertNorm = transform_vectors(trans, mesh.normals, 0)
 
     # Set the data
     data["position"] = vertPos*self.scale
@@ -1,4 +1,5 @@
 import OpenGL.GL as gl
+import hashlib
 import os
 import dent.assets
 import numpy as np
@@ -9,25 +10,90 @@ from . import Shaders
 from . import transforms
 import logging
 from . import taskQueue
-import threading
 from . import ActionController
-from dent.Mesh import Mesh
+from dent.Mesh import Mesh, merge_meshes
 from dent.Material import Material
 from collections import namedtuple
 from . import Animation
+from . import meshopt
+from . import lod
+from . import vertexformat
+from . import culling
+from .SceneGraph import as_node
 
 MeshOptions = namedtuple("MeshOptions", ("has_bumpmap", "has_bones"))
 MeshDatum = namedtuple("MeshDatum", ("name", "options", "mesh"))
 
 
+def _transform_property(name):
+    """A property that clears the cached model matrix when it is set.  Objects with
+    a transform store keep the value there."""
+    attribute = "_" + name
+
+    def get(self):
+        if self.transform_store is not None:
+            return self.transform_store.get(self.transform_handle, name)
+        return getattr(self, attribute)
+
+    def set(self, value):
+        if self.transform_store is not None:
+            self.transform_store.set(self.transform_handle, name, value)
+        else:
+            setattr(self, attribute, value)
+        self.mark_dirty()
+
+    return property(get, set)
+
+
 class Object(object):
     """A typical in-game object.
 
     Args:
         filename (str): Path to the object file (``.FBX``, ``.obj`` etc.)
-        shader_name (str): The name of the shader to use to render this object
+        shader_name (str): The name of the shader to use to render this object.  If
+            this is None, the object is never drawn and only loads (or builds) its
+            assets, without touching the GPU.  This is how assets are baked offline.
+        optimise_meshes (bool): Whether to reorder the triangles and vertices of
+            each mesh for the GPU's vertex cache (see :mod:`dent.meshopt`).  The
+            optimised meshes are kept in the asset store.
+        lod_levels (int): The number of simplified levels of detail to make for
+            each mesh (see :mod:`dent.lod`).  These are kept in the asset store,
+            and drawn when the object is small on screen.
+        lod_thresholds (tuple): The angular sizes below which each level of
+            detail is drawn.
+        vertex_format (str): If given, meshes are stored and uploaded in the compact
+            vertex layout of :mod:`dent.vertexformat`, with positions as
+            ``"float16"`` or ``"snorm16"``.  The shader must read that layout, so
+            the default shader is then replaced by the builtin ``"compact"``
+            shader, which decodes it for a deferred render stage.  Other shaders
+            must decode it with the ``vertexformat.shd`` include.
+        static_batching (bool): Whether to merge all the meshes of each material
+            into one, so that each material is drawn with a single draw call.  The
+            merged meshes are kept in the asset store.  Individual meshes can then
+            no longer be culled or drawn separately.
+        transform_store (TransformStore): If given, the transform of this object is
+            kept in the store (see :mod:`dent.TransformStore`), which builds the
+            model matrices of all its objects together.  This is faster for many
+            moving objects.
+        load_priority (float): When loading in the background (`daemon`), objects
+            with a higher priority load first.  By default, nearer objects load
+            first.  Loading is done by the shared asset loader pool (see
+            :mod:`dent.LoaderPool`), which posts progress messages.
+
+    The model matrix is built from `position`, `direction`, `bidirection`, `angle`
+    and `scale` (and `last_unanimated_position` for animated objects), and only
+    rebuilt when one of these is set.  If one of their arrays is changed in place,
+    call `mark_dirty`.  An object attached to a node of a scene graph (see `attach`)
+    is drawn with that matrix relative to the node.
     """
 
+    position = _transform_property("position")
+    direction = _transform_property("direction")
+    bidirection = _transform_property("bidirection")
+    angle = _transform_property("angle")
+    scale = _transform_property("scale")
+    last_unanimated_position = _transform_property("last_unanimated_position")
+
     def __init__(
         self,
         filename,
@@ -39,6 +105,13 @@ class Object(object):
         will_animate=False,
         daemon=True,
         shader_name="general-noninstanced",
+        optimise_meshes=False,
+        lod_levels=0,
+        lod_thresholds=lod.DEFAULT_THRESHOLDS,
+        vertex_format=None,
+        static_batching=False,
+        transform_store=None,
+        load_priority=None,
     ):
 
         if name == None:
@@ -47,6 +120,12 @@ class Object(object):
         if will_animate:
             daemon = False
 
+        self._model = None
+        self.node = None
+        self.transform_store = transform_store
+        self.transform_handle = None
+        if transform_store is not None:
+            self.transform_handle = transform_store.add()
         self.filename = filename
         self.directory = os.path.dirname(filename)
         self.name = name
@@ -69,26 +148,53 @@ class Object(object):
         self.bidirection = np.array((1, 0, 0), dtype=float)
         self.angle = angle
         self.daemon = daemon
-
-        self.shader = Shaders.getShader(shader_name)
-
+        self.optimise_meshes = optimise_meshes
+        self.lod_levels = lod_levels
+        self.lod_thresholds = tuple(lod_thresholds)[:lod_levels]
+        self.lods = {}
+        self.lod_level = 0
+        self.vertex_format = vertex_format
+        self.static_batching = static_batching
+
+        self.shader = None
+        if vertex_format is not None and shader_name == "general-noninstanced":
+            shader_name = "compact"
+        if shader_name is not None:
+            self.shader = Shaders.getShader(shader_name)
+
+        self.materials = {}
         self.bounding_box_min = np.zeros(3, dtype=float) + 1e10
         self.bounding_box_max = np.zeros(3, dtype=float) - 1e10
 
         if self.filename[-4:] == ".fbx":
             self.scale *= 0.01
 
+        self.load_future = None
         if self.daemon:
-            thread = threading.Thread(target=self.loadFromFile)
-            thread.setDaemon(True)
-            thread.start()
+            if load_priority is None:
+                load_priority = -self.camera_distance()
+            self.load_future = dent.assets.loader.submit(
+                self.loadFromFile, priority=load_priority, name=self.name
+            )
         else:
             self.loadFromFile()
 
+    def camera_distance(self):
+        """The distance from the camera to this object, or 0 if there is no
+        camera."""
+        camera_position = Shaders.universalUniforms.get("CameraPosition")
+        if camera_position is None:
+            return 0.
+        return float(np.linalg.norm(np.asarray(self.position) - camera_position))
+
     def __del__(self):
         logging.info("Releasing object {}".format(self.name))
         # Release the pyassimp, as we no longer need it
         pyassimp.release(self.scene)
+        if self.transform_store is not None:
+            self.transform_store.remove(self.transform_handle)
+        if self.node is not None:
+            self.node.graph.remove_node(self.node)
 
     def loadFromFile(self):
         """Loads the object from the disk.  Where possible, the dent asset library will
@@ -96,11 +202,47 @@ class Object(object):
 
         logging.info("Loading object {} from {}".format(self.name, self.filename))
 
+        material_names = self.load_assets()
+
+        # These are built before being set, as the object may be drawn while loading
+        materials = dict(
+            [
+                (
+                    name,
+                    dent.assets.getAsset(
+                        self.name + "-material-" + name, type_hint=Material
+                    ),
+                )
+                for name in material_names
+            ]
+        )
+        meshes_per_material = {}
+        for material in list(materials.values()):
+            if self.shader is not None:
+                material.load_textures()
+            meshes_per_material[material.name] = []
+        for mesh in self.meshes:
+            meshes_per_material[mesh.mesh.material_name].append(mesh.mesh)
+        if self.static_batching:
+            self.batch_meshes(meshes_per_material)
+        self.meshes_per_material = meshes_per_material
+        self.materials = materials
+
+    def load_assets(self):
+        """Loads the meshes and bones of this object from the asset store, building
+        them (and the materials) from the object file if they are missing or out of
+        date.  Returns the names of the object's materials."""
+
+        sources = (self.filename,)
         material_names = dent.assets.getAsset(
-            self.name + "-material-names", lambda: None
+            self.name + "-material-names", lambda: None, sources=sources
+        )
+        self.bones = dent.assets.getAsset(
+            self.name + "-bones", lambda: {}, sources=sources
+        )
+        mesh_info = dent.assets.getAsset(
+            self.name + "-mesh_info", lambda: None, sources=sources
         )
-        self.bones = dent.assets.getAsset(self.name + "-bones", lambda: {})
-        mesh_info = dent.assets.getAsset(self.name + "-mesh_info", lambda: None)
         full_meshes = []
         if mesh_info is None or material_names is None:
             # Some of these are for static only and must be removed when doing bones.
@@ -115,18 +257,21 @@ class Object(object):
             )
             mesh_info = []
 
-            self.materials = {}
+            materials = {}
             for material in self.scene.materials:
-                self.materials[material.properties[("name", 0)]] = Material()
-                self.materials[material.properties[("name", 0)]].load_from_assimp(
+                materials[material.properties[("name", 0)]] = Material()
+                materials[material.properties[("name", 0)]].load_from_assimp(
                     material, self.directory
                 )
                 dent.assets.saveAsset(
                     self.name + "-material-" + material.properties[("name", 0)],
-                    self.materials[material.properties[("name", 0)]],
+                    materials[material.properties[("name", 0)]],
+                    sources,
                 )
-            material_names = list(self.materials.keys())
-            dent.assets.saveAsset(self.name + "-material-names", material_names)
+            material_names = list(materials.keys())
+            dent.assets.saveAsset(
+                self.name + "-material-names", material_names, sources
+            )
 
             def addNode(node, trans, node_info):
                 newtrans = trans.dot(node.transformation)
@@ -151,7 +296,7 @@ class Object(object):
             t = np.eye(4)
             addNode(self.scene.rootnode, t, mesh_info)
 
-            dent.assets.saveAsset(self.name + "-mesh_info", mesh_info)
+            dent.assets.saveAsset(self.name + "-mesh_info", mesh_info, sources)
 
         if full_meshes:
             mesh_info = full_meshes
@@ -159,25 +304,18 @@ class Object(object):
             self.addMesh(*mesh)
 
         self.bones = dent.assets.getAsset(
-            self.name + "-bones", lambda: self.bones, forceReload=True
+            self.name + "-bones", lambda: self.bones, forceReload=True, sources=sources
         )
 
-        self.materials = dict(
-            [
-                (
-                    name,
-                    dent.assets.getAsset(
-                        self.name + "-material-" + name, type_hint=Material
-                    ),
-                )
-                for name in material_names
-            ]
+        dent.assets.set_references(
+            self.name + "-mesh_info", [mesh[0] for mesh in mesh_info]
         )
-        for material in list(self.materials.values()):
-            material.load_textures()
-            self.meshes_per_material[material.name] = []
-        for mesh in self.meshes:
-            self.meshes_per_material[mesh.mesh.material_name].append(mesh.mesh)
+        dent.assets.set_references(
+            self.name + "-material-names",
+            [self.name + "-material-" + name for name in material_names],
+        )
+
+        return material_names
 
     def addMesh(self, name, assimp_mesh, trans):
         """Adds a mesh to this object.  This may be loaded from cache if possible."""
@@ -189,15 +327,51 @@ class Object(object):
             mesh.load_from_assimp(assimp_mesh, self.directory, self.scene, self)
             return mesh
 
-        mesh = dent.assets.getAsset(name, load_mesh_from_assimp, type_hint=Mesh)
+        def load_mesh():
+            return dent.assets.getAsset(
+                name, load_mesh_from_assimp, type_hint=Mesh, sources=(self.filename,)
+            )
+
+        # Assets made from the mesh are named after it, so that those made from the
+        # optimised mesh are kept apart from those made from the original
+        base_name = name
+        if self.optimise_meshes:
+            base_name = name + "-optimised"
+
+            def load_optimised_mesh():
+                return meshopt.optimise(load_mesh(), name=base_name)
+
+            mesh = dent.assets.getAsset(
+                base_name,
+                load_optimised_mesh,
+                type_hint=Mesh,
+                sources=(self.filename,),
+            )
+        else:
+            mesh = load_mesh()
 
         # Update the bounding box
-        self.bounding_box_min = np.min(
-            [self.bounding_box_min, np.min(mesh.data["position"], 0)], 0
-        )
-        self.bounding_box_max = np.max(
-            [self.bounding_box_min, np.max(mesh.data["position"], 0)], 0
-        )
+        if mesh.bounds is not None:
+            self.bounding_box_min = np.minimum(self.bounding_box_min, mesh.bounds[0])
+            self.bounding_box_max = np.maximum(self.bounding_box_max, mesh.bounds[1])
+
+        lods = [mesh]
+        for level in range(1, self.lod_levels + 1):
+            lod_name = "{}-lod{}".format(base_name, level)
+            lods.append(
+                dent.assets.getAsset(
+                    lod_name,
+                    lambda level=level, lod_name=lod_name: lod.simplify(
+                        mesh, lod.resolution(mesh, level), lod_name
+                    ),
+                    type_hint=Mesh,
+                    sources=(self.filename,),
+                )
+            )
+        # Batched meshes are merged (and then compacted) once all are loaded
+        if self.vertex_format is not None and not self.static_batching:
+            lods = [self.compact_mesh(level_mesh) for level_mesh in lods]
+        self.lods[mesh.name] = lods
 
         # Do skinning
         if self.will_animate:
@@ -205,10 +379,67 @@ class Object(object):
                 options = options._replace(has_bones=True)
 
         self.meshes.append(MeshDatum(name, options, mesh))
-        if self.daemon:
-          taskQueue.addToMainThreadQueue(self.uploadMesh, (mesh,))
-        else:
-          self.uploadMesh(mesh)
+        if self.shader is None or self.static_batching:
+            return
+        self.upload_lods(lods)
+
+    def batch_meshes(self, meshes_per_material):
+        """Merges the meshes of each material (and each of their levels of detail)
+        in `meshes_per_material` into one.
+
+        The name of each merged mesh includes a digest of the names of the meshes it
+        is made from, and whether they are optimised, so that changing either does
+        not load a stale merged mesh."""
+        for material_name, meshes in list(meshes_per_material.items()):
+            if not meshes:
+                continue
+            digest = hashlib.sha256(
+                "\n".join(mesh.name for mesh in meshes).encode("utf-8")
+            ).hexdigest()[:8]
+            batch_name = "{}-batch-{}-{}".format(self.name, material_name, digest)
+            if self.optimise_meshes:
+                batch_name += "-optimised"
+            lods = []
+            for level in range(self.lod_levels + 1):
+                level_name = batch_name
+                if level > 0:
+                    level_name = "{}-lod{}".format(batch_name, level)
+                level_meshes = [self.lods[mesh.name][level] for mesh in meshes]
+                lods.append(
+                    dent.assets.getAsset(
+                        level_name,
+                        lambda level_meshes=level_meshes, level_name=level_name: (
+                            merge_meshes(level_meshes, level_name)
+                        ),
+                        type_hint=Mesh,
+                        sources=(self.filename,),
+                    )
+                )
+            if self.vertex_format is not None:
+                lods = [self.compact_mesh(level_mesh) for level_mesh in lods]
+            self.lods[batch_name] = lods
+            meshes_per_material[material_name] = [lods[0]]
+            if self.shader is not None:
+                self.upload_lods(lods)
+
+    def upload_lods(self, lods):
+        """Uploads a mesh and its levels of detail, on the main thread if this
+        object is loading in the background."""
+        for level_mesh in lods:
+            if self.daemon:
+              taskQueue.addToMainThreadQueue(self.uploadMesh, (level_mesh,))
+            else:
+              self.uploadMesh(level_mesh)
+
+    def compact_mesh(self, mesh):
+        """Loads (or builds) the compact vertex layout version of a mesh.  This is
+        named after the mesh, whose name marks whether it was optimised."""
+        return dent.assets.getAsset(
+            "{}-{}".format(mesh.name, self.vertex_format),
+            lambda: vertexformat.compact_mesh(mesh, self.vertex_format),
+            type_hint=Mesh,
+            sources=(self.filename,),
+        )
 
     def uploadMesh(self, mesh):
         self.renderIDs[mesh.name] = self.shader.setData(mesh.data, mesh.indices)
@@ -218,8 +449,43 @@ class Object(object):
         if self.action_controller is not None:
             self.action_controller.update(time)
 
-    def display(self):
-        self.shader.load()
+    def mark_dirty(self):
+        """Notes that the transform of this object has changed."""
+        self._model = None
+        if self.transform_store is not None:
+            self.transform_store.mark_dirty(self.transform_handle)
+        if self.node is not None:
+            self.node.invalidate()
+
+    def add_to_graph(self, graph):
+        """Adds this object to the root of a scene graph, so that others can be
+        attached to it."""
+        if self.node is None:
+            self.node = graph.add_node(local_function=self.local_matrix)
+
+    def attach(self, parent):
+        """Attaches this object to a scene graph node, or to another object (or
+        camera) in a scene graph, so that it moves with it."""
+        parent = as_node(parent)
+        if self.node is None:
+            self.add_to_graph(parent.graph)
+        self.node.parent = parent
+
+    def local_matrix(self):
+        """The matrix made from this object's own transform."""
+        if self.transform_store is not None:
+            return self.transform_store.matrix(self.transform_handle)
+        if self._model is None:
+            self._model = self._build_model_matrix()
+        return self._model
+
+    def model_matrix(self):
+        """The matrix taking this object's meshes to world space."""
+        if self.node is not None:
+            return self.node.world
+        return self.local_matrix()
+
+    def _build_model_matrix(self):
         t = np.eye(4, dtype=np.float32)
         t[2, 0:3] = self.direction
         t[0, 0:3] = self.bidirection
@@ -239,18 +505,121 @@ class Object(object):
             transforms.translate(
                 t, self.position[0], self.position[1], self.position[2]
             )
-        self.shader["model"] = t
+        return t
+
+    def draw_items(self):
+        """Lists the meshes to draw this frame, after culling and choosing levels of
+        detail, as (material, render ID, uniforms) triples."""
+        t = self.model_matrix()
 
+        # Skinned meshes move out of their bounds, so are never culled
+        frustum = culling.current_frustum
         if self.action_controller is not None:
-            self.shader["bones"] = self.bone_transforms
-            self.shader["hasSkinning"] = 1
-        else:
-            self.shader["hasSkinning"] = 0
+            frustum = None
+        if frustum is not None and not frustum.test_sphere(*self.bounding_sphere(t)):
+            culling.stats.add(
+                frustum.name,
+                0,
+                sum(len(meshes) for meshes in self.meshes_per_material.values()),
+            )
+            return []
+
+        if self.lod_levels:
+            self.lod_level = lod.select_lod(
+                self.angular_size(t), self.lod_level, self.lod_thresholds
+            )
+
+        uniforms = {"model": t, "hasSkinning": 0}
+        if self.action_controller is not None:
+            uniforms["bones"] = self.bone_transforms
+            uniforms["hasSkinning"] = 1
+
+        items = []
         for material in list(self.materials.values()):
-            material.set_uniforms(self.shader)
-            for mesh in self.meshes_per_material[material.name]:
-                if mesh.name in self.renderIDs:
-                    self.shader.draw(gl.GL_TRIANGLES, self.renderIDs[mesh.name])
+            meshes = self.meshes_per_material.get(material.name, ())
+            if frustum is not None and meshes:
+                meshes = self.cull_meshes(frustum, meshes, t)
+            for mesh in meshes:
+                lods = self.lods.get(mesh.name, (mesh,))
+                level_mesh = lods[min(self.lod_level, len(lods) - 1)]
+                if level_mesh.name not in self.renderIDs:
+                    level_mesh = lods[0]
+                if level_mesh.name not in self.renderIDs:
+                    continue
+                mesh_uniforms = uniforms
+                if level_mesh.position_scale is not None:
+                    mesh_uniforms = dict(
+                        uniforms,
+                        positionScale=level_mesh.position_scale.astype(np.float32),
+                        positionOffset=level_mesh.position_offset.astype(np.float32),
+                    )
+                items.append(
+                    (material, self.renderIDs[level_mesh.name], mesh_uniforms)
+                )
+        return items
+
+    def display(self):
+        items = self.draw_items()
+        if not items:
+            return
+        self.shader.load()
+        material = None
+        for item_material, render_id, uniforms in items:
+            if item_material is not material:
+                material = item_material
+                material.set_uniforms(self.shader)
+            for name, value in uniforms.items():
+                self.shader[name] = value
+            self.shader.draw(gl.GL_TRIANGLES, render_id)
+
+    def queue_draws(self, queue, stage=0):
+        """Adds the draws of this frame to a render queue, rather than drawing them
+        immediately (see `dent.RenderQueue`)."""
+        items = self.draw_items()
+        if not items:
+            return
+        depth = 0.
+        camera_position = Shaders.universalUniforms.get("CameraPosition")
+        if camera_position is not None:
+            depth = np.linalg.norm(
+                self.bounding_sphere(items[0][2]["model"])[0] - camera_position
+            )
+        for material, render_id, uniforms in items:
+            queue.add(
+                self.shader, material, render_id, gl.GL_TRIANGLES, uniforms, stage, depth
+            )
+
+    def bounding_sphere(self, model):
+        """The centre and radius of a sphere bounding this object, when drawn with
+        the given model matrix.  Before any meshes are loaded, this is everywhere."""
+        if np.any(self.bounding_box_min > self.bounding_box_max):
+            return np.zeros(3), np.inf
+        centres, radii = culling.transform_spheres(
+            (self.bounding_box_min + self.bounding_box_max) / 2,
+            [np.linalg.norm(self.bounding_box_max - self.bounding_box_min) / 2],
+            model,
+        )
+        return centres[0], radii[0]
+
+    def cull_meshes(self, frustum, meshes, model):
+        """The meshes whose bounds, when drawn with the given model matrix, are in
+        the frustum."""
+        centres = np.zeros((len(meshes), 3))
+        radii = np.full(len(meshes), np.inf)
+        for i, mesh in enumerate(meshes):
+            if mesh.bounding_sphere is not None:
+                centres[i], radii[i] = mesh.bounding_sphere
+        centres, radii = culling.transform_spheres(centres, radii, model)
+        return frustum.cull(meshes, centres, radii)
+
+    def angular_size(self, model):
+        """The angular size of this object, as seen from the camera, when drawn with
+        the given model matrix."""
+        camera_position = Shaders.universalUniforms.get("CameraPosition")
+        if camera_position is None:
+            return np.inf
+        centre, radius = self.bounding_sphere(model)
+        return lod.angular_size(centre, radius, camera_position)
 
     def add_animation(self, filename):
         if self.action_controller is None:
@@ -262,7 +631,7 @@ class Object(object):
             return animation
 
         animation = dent.assets.getAsset(
-            filename, load_animation, type_hint=Animation.Animation
+            filename, load_animation, type_hint=Animation.Animation, sources=(filename,)
         )
         self.action_controller.add_action(animation)
 
@@ -0,0 +1,110 @@
+from collections import namedtuple
+
+DrawItem = namedtuple(
+    "DrawItem", ("key", "shader", "material", "render_id", "mode", "uniforms")
+)
+
+# The widths of the fields of a sort key, from most to least significant.
+STAGE_BITS = 4
+SHADER_BITS = 12
+MATERIAL_BITS = 16
+DEPTH_BITS = 16
+VAO_BITS = 16
+
+
+def pack_key(stage, shader, material, depth, vao):
+    """Packs the fields of a sort key into one integer, so that keys sort by stage,
+    then shader, material, (quantised) depth and vertex array."""
+    key = stage & (1 << STAGE_BITS) - 1
+    for value, bits in (
+        (shader, SHADER_BITS),
+        (material, MATERIAL_BITS),
+        (depth, DEPTH_BITS),
+        (vao, VAO_BITS),
+    ):
+        key = key << bits | value & (1 << bits) - 1
+    return key
+
+
+class RenderQueue(object):
+    """Collects draws from many objects and submits them sorted by state.
+
+    Each draw is given a key, packing its render stage, shader, material, depth and
+    vertex array (see `pack_key`).  Submitting the queue sorts the draws by key,
+    so that draws sharing a shader and material are adjacent, and then only loads a
+    shader or sets a material's textures and uniforms when it differs from the
+    previous draw's.  Within a material, draws go from front to back, so that the
+    depth test rejects more fragments.
+
+    The number of draws, and of shader and material changes made and saved by the
+    last submission, are kept in `stats`.
+
+    Args:
+        far (float): The depth beyond which all draws sort together.
+    """
+
+    def __init__(self, far=1000.):
+        self.far = far
+        self.items = []
+        self.stats = {}
+        # Small integers standing for each shader and material in the sort keys of
+        # the queued draws.  These are cleared with the queue.
+        self._ids = {}
+
+    def _id(self, obj):
+        if obj is None:
+            return 0
+        if id(obj) not in self._ids:
+            self._ids[id(obj)] = (len(self._ids) + 1, obj)
+        return self._ids[id(obj)][0]
+
+    def add(self, shader, material, render_id, mode, uniforms={}, stage=0, depth=0.):
+        """Queues a draw of `render_id` with `shader`, after setting `material` and
+        `uniforms` on it."""
+        depth = int(min(max(depth / self.far, 0), 1) * ((1 << DEPTH_BITS) - 1))
+        key = pack_key(stage, self._id(shader), self._id(material), depth, render_id)
+        self.items.append(DrawItem(key, shader, material, render_id, mode, uniforms))
+
+    def clear(self):
+        self.items = []
+        self._ids = {}
+
+    def submit(self):
+        """Draws everything queued, in order of key, and clears the queue."""
+        self.items.sort(key=lambda item: item.key)
+        stats = dict.fromkeys(
+            (
+                "draws",
+                "shader_changes",
+                "shader_changes_saved",
+                "material_changes",
+                "material_changes_saved",
+            ),
+            0,
+        )
+        shader = None
+        material = None
+        for item in self.items:
+            if item.shader is not shader:
+                shader = item.shader
+                shader.load()
+                material = None
+                stats["shader_changes"] += 1
+            else:
+                stats["shader_changes_saved"] += 1
+            if item.material is not material:
+                material = item.material
+                if material is not None:
+                    material.set_uniforms(shader)
+                stats["material_changes"] += 1
+            else:
+                stats["material_changes_saved"] += 1
+            for name, value in item.uniforms.items():
+                shader[name] = value
+            shader.draw(item.mode, item.render_id)
+            stats["draws"] += 1
+        self.stats = stats
+        self.clear()
+
+    def __len__(self):
+        return len(self.items)
@@ -1,7 +1,11 @@
+import logging
 from dent.Camera import MouseControlledCamera
 from dent.RenderPipeline import RenderPipeline
 from dent.RenderStage import RenderStage
 from dent.PhongLightingStage import PhongLightingStage
+from dent import culling
+from dent.RenderQueue import RenderQueue
+from dent.SceneGraph import SceneGraph, SceneNode
 
 
 class Scene(object):
@@ -12,20 +16,71 @@ class Scene(object):
             [RenderStage(render_func=self.display, final_stage=True)]
         )
         self._objects = []
+        self.render_queue = RenderQueue()
+        self.graph = SceneGraph()
+        self._warned_no_projection = False
+
+    def add(self, obj, parent=None):
+        """Adds an object to the scene, optionally attached to a parent object (or
+        scene graph node) so that it moves with it."""
+        self._objects.append(obj)
+        if parent is not None:
+            if not isinstance(parent, SceneNode):
+                parent.add_to_graph(self.graph)
+            obj.attach(parent)
+
+    def remove(self, obj):
+        """Removes an object from the scene, and its node from the scene graph.
+        Anything attached to it is moved to the root of the graph."""
+        self._objects.remove(obj)
+        if getattr(obj, "node", None) is not None:
+            self.graph.remove_node(obj.node)
+            obj.node = None
 
     def render(self, windowWidth, windowHeight):
         self.renderPipeline.run(windowWidth, windowHeight)
 
+    def frustum(self):
+        """The view frustum of the scene's camera, or None (so that nothing is
+        culled) if the camera has no `projection`."""
+        if self.camera.projection is None:
+            if not self._warned_no_projection:
+                logging.warning("The camera has no projection, so nothing is culled")
+                self._warned_no_projection = True
+            return None
+        return culling.Frustum.from_view_projection(
+            self.camera.world_view(), self.camera.projection
+        )
+
     def display(self, **kwargs):
         self.camera.render()
-        for obj in self._objects:
-            obj.display()
+        # A pass (such as a shadow cascade) may have set its own frustum to cull with
+        supplied = culling.current_frustum
+        if supplied is None:
+            culling.current_frustum = self.frustum()
+            if culling.current_frustum is not None:
+                culling.stats.reset(culling.current_frustum.name)
+        try:
+            # Objects that can queue their draws are drawn together, sorted by
+            # state.  The others (such as instanced objects) are drawn after them,
+            # and are not counted in the queue's stats.
+            unqueued = []
+            for obj in self._objects:
+                if getattr(obj, "queue_draws", None) is not None:
+                    obj.queue_draws(self.render_queue)
+                else:
+                    unqueued.append(obj)
+            self.render_queue.submit()
+            for obj in unqueued:
+                obj.display()
+        finally:
+            culling.current_frustum = supplied
 
 
 class DeferredRenderScene(Scene):
 
     def __init__(self, phong_final=True):
-        self.camera = MouseControlledCamera()
+        super(DeferredRenderScene, self).__init__()
         self.renderPipeline = RenderPipeline(
             [
                 RenderStage(render_func=self.display),
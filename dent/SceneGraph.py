@@ -0,0 +1,198 @@
+"""A hierarchy of transforms.
+
+Each node of a :class:`SceneGraph` has a local matrix, relative to its parent, and
+a world matrix, which is its local matrix followed by its parent's world matrix (in
+the row vector convention of :mod:`dent.transforms`, ``world = local . parent``).
+The matrices of all the nodes are held in contiguous arrays, and the world matrices
+are updated a level of the hierarchy at a time, with one batched matrix product per
+level.  Only nodes whose local matrix, or whose ancestors' local matrices, have
+changed since the last update are recomputed.
+
+A node may have a function giving its local matrix, such as an object's model
+matrix.  Calling :meth:`SceneNode.invalidate` then marks that the function's value
+has changed, and it is only called again at the next update.  Bound methods are held
+weakly, so that the graph does not keep their objects alive.
+"""
+import types
+import weakref
+import numpy as np
+
+
+class SceneNode(object):
+    """A node of a scene graph.  These are made by :meth:`SceneGraph.add_node`."""
+
+    def __init__(self, graph, index, local_function=None):
+        self.graph = graph
+        self.index = index
+        if isinstance(local_function, types.MethodType):
+            self._local_function = weakref.WeakMethod(local_function)
+        else:
+            self._local_function = lambda: local_function
+        self.children = []
+        self._parent = None
+
+    @property
+    def local_function(self):
+        """The function giving this node's local matrix, or None if there is none
+        (or its object has been deleted)."""
+        return self._local_function()
+
+    @property
+    def local(self):
+        return self.graph.local[self.index]
+
+    @local.setter
+    def local(self, matrix):
+        self.graph.local[self.index] = matrix
+        self.graph.dirty[self.index] = True
+
+    @property
+    def world(self):
+        self.graph.update()
+        return self.graph.world[self.index]
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        self.graph.set_parent(self, parent)
+
+    def invalidate(self):
+        """Notes that the value of this node's local function has changed."""
+        self.graph.pending.add(self)
+
+
+def as_node(parent):
+    """The scene graph node of `parent`, which may be a node or anything (such as an
+    object or a camera) attached to a scene graph."""
+    if isinstance(parent, SceneNode):
+        return parent
+    if getattr(parent, "node", None) is None:
+        raise ValueError("{} is not in a scene graph".format(parent))
+    return parent.node
+
+
+def world_matrices(matrices, node):
+    """Takes matrices relative to `node` (such as the models of instances) to world
+    space.  If `node` is None, they are returned unchanged."""
+    if node is None:
+        return matrices
+    return np.matmul(matrices, node.world)
+
+
+class SceneGraph(object):
+    """A hierarchy of nodes, with their matrices held in contiguous arrays."""
+
+    def __init__(self, capacity=64):
+        self.local = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.world = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.parents = np.full(capacity, -1, dtype=np.int64)
+        self.dirty = np.zeros(capacity, dtype=bool)
+        self.nodes = []
+        self.pending = set()
+        # The indices of removed nodes, to be reused
+        self._free = []
+        # The indices of the nodes at each depth, or None if they need finding
+        self._levels = None
+
+    def _grow(self):
+        capacity = 2 * len(self.parents)
+        for name in ("local", "world", "parents", "dirty"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+        self.parents[len(self.nodes) :] = -1
+
+    def add_node(self, local=None, parent=None, local_function=None):
+        """Adds a node to the graph, at the root if `parent` is None."""
+        if self._free:
+            node = SceneNode(self, self._free.pop(), local_function)
+            self.nodes[node.index] = node
+        else:
+            if len(self.nodes) == len(self.parents):
+                self._grow()
+            node = SceneNode(self, len(self.nodes), local_function)
+            self.nodes.append(node)
+        node.local = np.eye(4) if local is None else local
+        if local_function is not None:
+            node.invalidate()
+        self._levels = None
+        if parent is not None:
+            self.set_parent(node, parent)
+        return node
+
+    def set_parent(self, node, parent):
+        """Moves a node (and its subtree) under a new parent, or to the root if
+        `parent` is None."""
+        if parent is not None:
+            parent = as_node(parent)
+            if parent.graph is not self:
+                raise ValueError("Nodes must be in the same scene graph")
+            ancestor = parent
+            while ancestor is not None:
+                if ancestor is node:
+                    raise ValueError("A node cannot be its own ancestor")
+                ancestor = ancestor.parent
+        if node._parent is not None:
+            node._parent.children.remove(node)
+        node._parent = parent
+        self.parents[node.index] = -1 if parent is None else parent.index
+        if parent is not None:
+            parent.children.append(node)
+        self.dirty[node.index] = True
+        self._levels = None
+
+    def remove_node(self, node):
+        """Removes a node from the graph.  Its children are moved to the root."""
+        if self.nodes[node.index] is not node:
+            return
+        for child in list(node.children):
+            self.set_parent(child, None)
+        self.set_parent(node, None)
+        self.pending.discard(node)
+        self.dirty[node.index] = False
+        self.nodes[node.index] = None
+        self._free.append(node.index)
+        self._levels = None
+
+    def levels(self):
+        """The indices of the nodes at each depth of the hierarchy."""
+        if self._levels is None:
+            self._levels = []
+            level = [
+                node for node in self.nodes if node is not None and node.parent is None
+            ]
+            while level:
+                self._levels.append(np.array([node.index for node in level]))
+                level = [child for node in level for child in node.children]
+        return self._levels
+
+    def update(self):
+        """Recomputes the world matrices of the nodes that have changed."""
+        for node in self.pending:
+            local_function = node.local_function
+            if local_function is not None:
+                self.local[node.index] = local_function()
+                self.dirty[node.index] = True
+        self.pending.clear()
+        count = len(self.nodes)
+        if not self.dirty[:count].any():
+            return
+
+        levels = self.levels()
+        roots = levels[0][self.dirty[levels[0]]]
+        self.world[roots] = self.local[roots]
+        for level in levels[1:]:
+            # A node is dirty if its parent is
+            self.dirty[level] |= self.dirty[self.parents[level]]
+            changed = level[self.dirty[level]]
+            self.world[changed] = np.matmul(
+                self.local[changed], self.world[self.parents[changed]]
+            )
+        self.dirty[:count] = False
+
+    def __len__(self):
+        return len(self.nodes) - len(self._free)
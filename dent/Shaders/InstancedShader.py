@@ -73,7 +73,7 @@ class InstancedShader(GenericShader):
         gl.glDrawElementsInstancedBaseInstance(
             type,
             self.objInfo[objectIndex].renderVerts // 3,
-            gl.GL_UNSIGNED_INT,
+            self.objInfo[objectIndex].indexType,
             None,
             num,
             offset,
@@ -4,6 +4,7 @@ import ctypes
 import numpy as np
 import logging
 from . import ShaderFile
+from dent import vertexformat
 
 currentShader = None
 
@@ -18,10 +19,33 @@ objectInfo = namedtuple(
         "renderVerts",
         "instbo",
         "transformBufferObject",
+        "indexType",
     ),
 )
 
 
+# The OpenGL type of each vertex attribute component type, and whether integer
+# components are normalised.  For backwards compatibility, 32 bit integer fields
+# are described to OpenGL as floats, as they always have been.
+ATTRIBUTE_TYPES = {
+    np.dtype(np.float32): (gl.GL_FLOAT, False),
+    np.dtype(np.int32): (gl.GL_FLOAT, False),
+    np.dtype(np.float16): (gl.GL_HALF_FLOAT, False),
+    np.dtype(np.int16): (gl.GL_SHORT, True),
+    np.dtype(np.uint16): (gl.GL_UNSIGNED_SHORT, True),
+    np.dtype(np.int8): (gl.GL_BYTE, True),
+    np.dtype(np.uint8): (gl.GL_UNSIGNED_BYTE, True),
+}
+
+
+# The OpenGL type of each index type.  Other indices are uploaded as 32 bits.
+INDEX_TYPES = {
+    np.dtype(np.uint8): gl.GL_UNSIGNED_BYTE,
+    np.dtype(np.uint16): gl.GL_UNSIGNED_SHORT,
+    np.dtype(np.uint32): gl.GL_UNSIGNED_INT,
+}
+
+
 class Shader(object):
 
     def __init__(self, name):
@@ -41,6 +65,10 @@ class Shader(object):
         self.unsetUniforms = {}
         # Uniforms that are set.  A copy is kept for smooth reloading
         self.uniforms = {}
+        # The active attributes of each program, as a map from name to location
+        self.attributes = {}
+        # The packed vertex layout used for each (vertex dtype, program) pair
+        self.layouts = {}
 
     def build(self):
         global currentShader
@@ -92,6 +120,9 @@ class Shader(object):
     def setData(self, data, indices=[], instanced=False):
         """Given vertex data and triangle indices, gives a unique identifier to be
     used when rendering this object."""
+        indices = np.asarray(indices)
+        if indices.dtype not in INDEX_TYPES:
+            indices = indices.astype(np.uint32)
         vbo = gl.glGenBuffers(1)
         ibo = gl.glGenBuffers(1)
         vertexArray = gl.glGenVertexArrays(1)
@@ -105,36 +136,44 @@ class Shader(object):
                 ibo,
                 len(indices) * 3,
                 None,
-                None
+                None,
+                INDEX_TYPES[indices.dtype],
             )
         )
 
+        # Only upload the attributes this shader reads
+        _, locations = self.get_layout(data.dtype)
+        data = vertexformat.pack_fields(data, locations)
+        # Other types (such as 64 bit floats) are uploaded as 32 bit floats
+        data = vertexformat.convert_fields(data, ATTRIBUTE_TYPES)
+
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
         gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_STATIC_DRAW)
         stride = data.strides[0]
-        offsetc = 0
-        for i in data.dtype.names:
-            offset = ctypes.c_void_p(offsetc)
-            loc = gl.glGetAttribLocation(self.program, i)
-            if loc == -1:
-                # Not in shader
-                offsetc += data.dtype[i].itemsize
-                continue
+        for i, loc in locations.items():
+            offset = ctypes.c_void_p(data.dtype.fields[i][1])
 
             gl.glEnableVertexAttribArray(loc)
             gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
-            gl.glVertexAttribPointer(
-                loc,
-                int(np.prod(data.dtype[i].shape)),
-                gl.GL_FLOAT,
-                False,
-                stride,
-                offset,
+            base = data.dtype[i].base
+            size = int(np.prod(data.dtype[i].shape))
+            integer = (
+                i in vertexformat.INTEGER_FIELDS
+                and base.kind in "ui"
+                and base.itemsize < 4
             )
+            if integer:
+                gl.glVertexAttribIPointer(
+                    loc, size, ATTRIBUTE_TYPES[base][0], stride, offset
+                )
+            else:
+                gl_type, normalized = ATTRIBUTE_TYPES[base]
+                gl.glVertexAttribPointer(
+                    loc, size, gl_type, normalized, stride, offset
+                )
             gl.glVertexAttribDivisor(loc, 0)
-            offsetc += data.dtype[i].itemsize
 
-        if indices != []:
+        if len(indices) > 0:
             gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, ibo)
             gl.glBufferData(
                 gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW
@@ -142,6 +181,36 @@ class Shader(object):
 
         return len(self.objInfo) - 1
 
+    def get_attributes(self):
+        """Returns the active vertex attributes of the current program, as a map
+        from attribute name to location."""
+        if self.program not in self.attributes:
+            attributes = {}
+            for i in range(gl.glGetProgramiv(self.program, gl.GL_ACTIVE_ATTRIBUTES)):
+                name = gl.glGetActiveAttrib(self.program, i)[0]
+                if isinstance(name, bytes):
+                    name = name.decode()
+                location = gl.glGetAttribLocation(self.program, name)
+                if location != -1:
+                    attributes[name] = location
+            self.attributes[self.program] = attributes
+        return self.attributes[self.program]
+
+    def get_layout(self, dtype):
+        """Finds the packed vertex layout for vertex data of the given dtype.
+
+        Returns the packed dtype, holding only the fields the current program reads,
+        and a map from each of those fields to its attribute location."""
+        key = (dtype, self.program)
+        if key not in self.layouts:
+            attributes = self.get_attributes()
+            locations = {
+                name: attributes[name] for name in dtype.names if name in attributes
+            }
+            packed = vertexformat.pack_fields(np.zeros(0, dtype=dtype), locations)
+            self.layouts[key] = (packed.dtype, locations)
+        return self.layouts[key]
+
     def deleteData(self, dataId):
         obj = self.objInfo[dataId]
         gl.glDeleteBuffers(3, [obj.vbo, obj.ibo])
@@ -195,5 +264,8 @@ class Shader(object):
         self._setitems()
         gl.glBindVertexArray(self.objInfo[objectIndex].vertexArray)
         gl.glDrawElements(
-            type, self.objInfo[objectIndex].numIndices, gl.GL_UNSIGNED_INT, None
+            type,
+            self.objInfo[objectIndex].numIndices,
+            self.objInfo[objectIndex].indexType,
+            None,
         )
@@ -3,6 +3,8 @@ import OpenGL.GL as gl
 from .ShaderFile import ShaderFile
 
 universalUniforms = {}
+# The last value given to `setUniform` for each uniform
+uniformValues = {}
 
 from .GenericShader import GenericShader
 from .InstancedShader import InstancedShader
@@ -56,6 +58,7 @@ def getShader(name, tess=False, instance=False, geom=False):
 
 
 def setUniform(name, value):
+    uniformValues[name] = value
     for i in shaders:
         shaders[i][name] = value
 
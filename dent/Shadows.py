@@ -4,6 +4,7 @@ from .RenderStage import RenderStage
 from . import transforms
 from . import Shaders
 from . import Camera
+from . import culling
 import numpy as np
 
 SHADOW_SIZE = 2048
@@ -63,11 +64,16 @@ class Shadows(object):
     self.shadowCamera.update()
     self.shadowCamera.render()
     self.count += 1
+    main_frustum = culling.current_frustum
     for i in range(3):
       if self.count % (self.exponent ** i) != 0:
         continue
       self.renderStages[i].load(SHADOW_SIZE, SHADOW_SIZE)
       Shaders.setUniform('projection',self.projections[i])
       self.shadowCamera.render('shadow'+str(i+1))
+      culling.current_frustum = culling.Frustum.from_view_projection(
+          self.shadowCamera.world_view(), self.projections[i], 'shadow'+str(i+1))
+      culling.stats.reset('shadow'+str(i+1))
 
       self.render_func()
+    culling.current_frustum = main_frustum
@@ -74,6 +74,26 @@ activeTexture = None
 texture_id_pool = set()
 
 
+def read_image(filename):
+    """Reads an image file into an RGBA array, laid out as `Texture.loadData` expects.
+
+    This uses the ``imageio`` library, so handles nearly any image format.  Eight bit
+    images are returned as bytes; anything else is scaled to floats.  No GPU work is
+    done, so this is safe to use when baking assets offline.
+    """
+    data = imageio.imread(filename)
+    data = data.reshape((data.shape[1], data.shape[0], -1))
+
+    # Make this a rgba file
+    if data.shape[2] != 4:
+        add = np.full((data.shape[0], data.shape[1], 1), 255, dtype=data.dtype)
+        data = np.append(data, add, axis=2)
+
+    if data.dtype != np.uint8:
+        data = data.astype(np.float32) / 255
+    return data
+
+
 def get_texture_id():
     """Obtains an unused texture id from the graphics library.
 
@@ -203,16 +223,15 @@ class Texture(object):
         Args:
             filename (str): Path to the image file (``.bmp``, ``.png`` etc)
         """
-        data = imageio.imread(filename).astype(float)
-        data = data.reshape((data.shape[1], data.shape[0], -1))
-
-        # Make this a rgba file
-        if (data.shape[2] != 4):
-            add = np.ones((data.shape[0], data.shape[1], 1)) * 255
-            data = np.append(data, add, axis=2)
-
+        self.loadImageData(read_image(filename))
         logging.info("Loaded texture %d from file %s", self.id, filename)
-        self.loadData(data / 255)
+
+    def loadImageData(self, data):
+        """Uploads an image array, as returned by `read_image`, to the GPU."""
+        if data.dtype == np.uint8:
+            self.loadData(data, type=gl.GL_UNSIGNED_BYTE)
+        else:
+            self.loadData(data)
 
     def read(self, x, y, interpolate=True):
         assert self._data is not None
@@ -272,9 +291,9 @@ class Texture(object):
         if "config" not in datastore.getnames() or "data" not in datastore.getnames():
             raise IOError()
 
-        config = yaml.load(datastore.extractfile("config").read())
+        config = yaml.safe_load(datastore.extractfile("config").read())
         texture = Texture(config["type"], internal_format=config["format"])
-        data = np.safe_load(datastore.extractfile("data"))
+        data = np.load(io.BytesIO(datastore.extractfile("data").read()))
         texture.loadData(data)
         return texture
 
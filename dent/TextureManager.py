@@ -5,16 +5,22 @@ import dent.assets
 _LOADED_TEXTURES = {}
 
 
+def get_image(path):
+    """Gets the decoded image data for a texture file from the asset store.
+
+    The store holds image data rather than GPU textures, so it can be filled without
+    a graphics context (for example by ``dent-assets bake``)."""
+    return dent.assets.getAsset(
+        path, dent.Texture.read_image, (path,), sources=(path,)
+    )
+
+
 def get_texture(path, texture_type):
     if (path, texture_type) not in _LOADED_TEXTURES:
         logging.info("Loading type {} texture from {}".format(texture_type, path))
 
-        def get_new_texture():
-            texture = dent.Texture.Texture(texture_type)
-            texture.loadFromImage(path)
-            return texture
-
-        _LOADED_TEXTURES[(path, texture_type)] = dent.assets.getAsset(
-            path, get_new_texture, type_hint=dent.Texture.Texture
-        )
+        data = get_image(path)
+        texture = dent.Texture.Texture(texture_type)
+        texture.loadImageData(data)
+        _LOADED_TEXTURES[(path, texture_type)] = texture
     return _LOADED_TEXTURES[(path, texture_type)]
@@ -0,0 +1,121 @@
+import numpy as np
+
+# The shape of each transform field of an object
+FIELDS = {
+    "position": (3,),
+    "direction": (3,),
+    "bidirection": (3,),
+    "angle": (),
+    "scale": (),
+    "anchor": (3,),
+}
+
+# The shape and type of each array in the store, including the fields
+_ARRAYS = dict((name, (shape, np.float64)) for name, shape in FIELDS.items())
+_ARRAYS.update(
+    {"models": ((4, 4), np.float32), "anchored": ((), bool), "dirty": ((), bool)}
+)
+
+
+class TransformStore(object):
+    """Holds the transforms of many objects in contiguous arrays.
+
+    Each object is given a handle, indexing its row of the `position`,
+    `direction`, `bidirection`, `angle` and `scale` arrays (and of `anchor`, the
+    ``last_unanimated_position`` of animated objects, which is used in place of the
+    position when `anchored` is set).  The model matrices of all the objects whose
+    transforms have changed are rebuilt together, in one batched computation, the
+    first time one of them is asked for.
+
+    Rows returned by `get` are views into the arrays, so changing them in place
+    changes the store, but (as for :class:`dent.Object.Object`) does not mark the
+    matrix as dirty.  The arrays are reallocated as the store grows, so views should
+    not be kept.
+    """
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self._free = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        for name, (shape, dtype) in _ARRAYS.items():
+            array = np.zeros((capacity,) + shape, dtype=dtype)
+            if hasattr(self, name):
+                array[: self.count] = getattr(self, name)[: self.count]
+            setattr(self, name, array)
+
+    def add(self):
+        """Adds an object at the origin, facing along z, returning its handle."""
+        if self._free:
+            handle = self._free.pop()
+        else:
+            if self.count == len(self.dirty):
+                self._allocate(2 * len(self.dirty))
+            handle = self.count
+            self.count += 1
+        for name in FIELDS:
+            getattr(self, name)[handle] = 0
+        self.direction[handle] = (0, 0, 1)
+        self.bidirection[handle] = (1, 0, 0)
+        self.scale[handle] = 1
+        self.anchored[handle] = False
+        self.dirty[handle] = True
+        return handle
+
+    def remove(self, handle):
+        """Frees the handle of an object that is no longer needed."""
+        self.dirty[handle] = False
+        self._free.append(handle)
+
+    def get(self, handle, name):
+        if name == "last_unanimated_position":
+            return self.anchor[handle] if self.anchored[handle] else None
+        return getattr(self, name)[handle]
+
+    def set(self, handle, name, value):
+        if name == "last_unanimated_position":
+            self.anchored[handle] = value is not None
+            if value is not None:
+                self.anchor[handle] = value
+        else:
+            getattr(self, name)[handle] = value
+        self.dirty[handle] = True
+
+    def mark_dirty(self, handle):
+        self.dirty[handle] = True
+
+    def update(self):
+        """Rebuilds the model matrices of all the objects that have changed."""
+        changed = np.flatnonzero(self.dirty[: self.count])
+        if len(changed) == 0:
+            return
+        cos = np.cos(self.angle[changed, np.newaxis])
+        sin = np.sin(self.angle[changed, np.newaxis])
+        direction = self.direction[changed]
+        bidirection = self.bidirection[changed]
+        scale = self.scale[changed, np.newaxis]
+
+        # As in Object, the x and z axes are the bidirection and direction turned
+        # by the angle, and the y axis is left alone.
+        models = np.zeros((len(changed), 4, 4), dtype=np.float32)
+        models[:, 0, :3] = (cos * bidirection + sin * direction) * scale
+        models[:, 1, 1] = scale[:, 0]
+        models[:, 2, :3] = (cos * direction - sin * bidirection) * scale
+        models[:, 3, :3] = np.where(
+            self.anchored[changed, np.newaxis],
+            self.anchor[changed],
+            self.position[changed],
+        )
+        models[:, 3, 3] = 1
+        self.models[changed] = models
+        self.dirty[changed] = False
+
+    def matrix(self, handle):
+        """The model matrix of an object."""
+        if self.dirty[handle]:
+            self.update()
+        return self.models[handle]
+
+    def __len__(self):
+        return self.count - len(self._free)
@@ -8,6 +8,19 @@ parser.add_argument("-d", "--debug", action="store_true")
 parser.add_argument("-v", "--verbose", action="count", default=0)
 
 parser.add_argument("--replay", default=None)
+parser.add_argument(
+    "--asset-report",
+    nargs="?",
+    const="-",
+    default=None,
+    help="on exit, write a report of asset loading times to this file (or stdout)",
+)
+parser.add_argument(
+    "--loader-workers",
+    type=int,
+    default=None,
+    help="the number of threads loading objects and assets in the background",
+)
 
 
 def parse():
@@ -1,17 +1,156 @@
 import hashlib
+import io
 import logging
 import os
 import tarfile
+import threading
 import pickle as pickle
+import time
 import numpy as np
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from dent.AssetCache import AssetCache
+from dent.AssetIndex import AssetIndex
+from dent.AssetPack import AssetPack, write_pack
+from dent.AssetStats import AssetStats
+from dent.LoaderPool import LoaderPool
+
+# Loaded assets are kept in memory (up to this many bytes of asset files) so that
+# repeated requests for the same asset do not go back to disk.
+DEFAULT_CACHE_BUDGET = 256 * 1024 ** 2
+
+cache = AssetCache(DEFAULT_CACHE_BUDGET)
+
+stats = AssetStats()
+
+DEFAULT_LOADER_WORKERS = 4
+
+loader = LoaderPool(DEFAULT_LOADER_WORKERS)
+
+_MISSING = object()
+
+_index = None
+_pack = None
+
+# Locks held while an asset is found or generated, so that concurrent requests for
+# an asset share a single generation.  The lock file extends this across processes.
+_asset_locks = {}
+_asset_locks_lock = threading.Lock()
+_held = threading.local()
+_lock_file = None
+LOCK_FILENAME = os.path.join(".", "_assets", "lock")
+
+# When each asset was last requested in this process, not yet written to the index.
+_accessed = {}
+
+# The number of bytes of loose asset files the store may hold, or None for no limit.
+store_limit = None
+
+PACK_FILENAME = os.path.join(".", "_assets", "assets.pack")
 
 
 def initialise():
     """Constructs an asset store, if it does not exist."""
+    global _index, _pack, _lock_file
+    _accessed.clear()
+    if _lock_file is not None:
+        _lock_file[1].close()
+        _lock_file = None
     logging.info("Initialising asset store")
     if not os.path.exists("./_assets"):
         logging.info("Asset store not present: constructing asset store")
         os.mkdir("./_assets")
+    _index = None
+    _pack = None
+    _migrate_flat_store()
+
+
+def get_index():
+    """Returns the index of the asset store, opening it if required."""
+    global _index
+    if _index is None:
+        _index = AssetIndex(os.path.join(".", "_assets", "index.log"))
+    return _index
+
+
+def get_pack():
+    """Returns the asset pack of the store, or None if it has none."""
+    global _pack
+    if _pack is None:
+        _pack = AssetPack(PACK_FILENAME) if os.path.exists(PACK_FILENAME) else False
+    return _pack or None
+
+
+def _find(assetID):
+    """Finds an asset, returning its record and whether to read it from the pack.
+
+    Assets are read from the pack unless they have been saved (as loose files) since
+    the pack was built."""
+    record = get_index().get(assetID)
+    pack = get_pack()
+    entry = pack.get(assetID) if pack is not None else None
+    if entry is not None:
+        if record is None or record["saved"] <= entry["record"]["saved"]:
+            return entry["record"], True
+    return record, False
+
+
+def build_pack(codec="raw", remove_loose=False):
+    """Packs every asset in the store into the store's asset pack.
+
+    `codec` is as for `dent.AssetPack.write_pack`.  If `remove_loose` is set, the
+    loose files of packed assets are deleted."""
+    global _pack
+    old_pack = get_pack()
+
+    def assets():
+        for assetID in getAllAssetIds():
+            record, packed = _find(assetID)
+            if packed:
+                yield assetID, old_pack.read(assetID), record
+            elif os.path.exists(get_filename(assetID)):
+                with open(get_filename(assetID), "rb") as f:
+                    yield assetID, f.read(), record
+
+    write_pack(PACK_FILENAME, assets(), codec)
+    _pack = None
+    if remove_loose:
+        for assetID in get_pack().entries:
+            if os.path.exists(get_filename(assetID)):
+                os.remove(get_filename(assetID))
+
+
+def _migrate_flat_store():
+    """Moves assets from the old flat store layout (a payload and a ``.meta`` file per
+    asset directly in ``_assets``) into shards, recording them in the index."""
+    for entry in os.listdir("./_assets"):
+        meta_filename = os.path.join(".", "_assets", entry)
+        if not entry.endswith(".meta"):
+            continue
+        assetID = entry[: -len(".meta")]
+        with open(meta_filename) as f:
+            lines = [x.strip() for x in f.readlines()]
+        old_filename = os.path.join(".", "_assets", assetID)
+        if os.path.exists(old_filename):
+            logging.info("Moving asset '%s' into sharded store", lines[0])
+            filename = get_filename(assetID)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            os.replace(old_filename, filename)
+            get_index().add(
+                {
+                    "id": assetID,
+                    "name": lines[0],
+                    "type": lines[1],
+                    "size": os.path.getsize(filename),
+                    "source_mtime": None,
+                    "saved": time.time(),
+                }
+            )
+        os.remove(meta_filename)
 
 
 def getInternalAssetID(assetID):
@@ -19,94 +158,544 @@ def getInternalAssetID(assetID):
 
 
 def get_filename(assetID):
-    """Finds the path of an asset by its ID."""
-    return os.path.join(".", "_assets", assetID)
+    """Finds the path of an asset by its ID.
+
+    Assets are sharded into subdirectories by the first two characters of their ID,
+    to keep directory sizes manageable."""
+    return os.path.join(".", "_assets", assetID[:2], assetID)
 
 
 def get_asset_metadata(assetID):
-    if assetID + ".meta" not in os.listdir("_assets"):
-        raise Exception("Asset not present")
+    """Returns the index record of an asset.
 
-    lines = [x.strip() for x in open("_assets/" + assetID + ".meta").readlines()]
-    return {"name": lines[0], "type": lines[1]}
+    This always includes the asset's ``name``, ``type`` and ``size``, and may include
+    type specific information (such as the bounds of a mesh)."""
+    record, _ = _find(assetID)
+    if record is None:
+        raise Exception("Asset not present")
+    return record
 
 
 def loadFromFile(filename: str, type_hint=None):
     """Attempts to load the asset from file.
 
-    This first tries the type spcified asset loader, then a numpy load and finally a
+    The file is memory mapped and loaded as by `loadFromBuffer`.  An empty file
+    (which cannot be mapped) raises an IOError, as for any other unreadable asset.
+    """
+    logging.debug(
+        "Loading asset from file %s (typehint %s)",
+        filename,
+        getattr(type_hint, "__name__", None),
+    )
+    if os.path.getsize(filename) == 0:
+        raise IOError("Empty asset file {}".format(filename))
+    return loadFromBuffer(np.memmap(filename, dtype=np.uint8, mode="r"), type_hint)
+
+
+def loadFromBuffer(buffer, type_hint=None):
+    """Attempts to load an asset from an array of bytes.
+
+    This first tries the type specified binary loader (which uses the buffer in
+    place), then the type specified tar loader, then a numpy load and finally a
     pickle load.
     """
-    logging.debug("Loading asset from file %s (typehint %s)", filename, type_hint.__name__)
+    if hasattr(type_hint, "_dent_asset_load_binary"):
+        magic = type_hint._dent_asset_magic
+        if bytes(buffer[: len(magic)]) == magic:
+            obj = type_hint._dent_asset_load_binary(buffer)
+            logging.debug("Loaded object with custom binary loader")
+            return obj
     if hasattr(type_hint, "_dent_asset_load"):
-        if tarfile.is_tarfile(filename):
-            datastore = tarfile.open(filename, "r")
+        try:
+            datastore = tarfile.open(fileobj=io.BytesIO(buffer), mode="r")
+        except tarfile.TarError:
+            pass
+        else:
             obj = type_hint._dent_asset_load(datastore)
             datastore.close()
             logging.debug("Loaded object with custom loader")
             return obj
     try:
-        obj = np.load(filename)
+        obj = np.load(io.BytesIO(buffer))
         logging.debug("Loaded object as numpy array")
         return obj
     except (IOError, ValueError) as e:
         pass
     try:
-        obj = pickle.load(open(filename, "rb"))
+        obj = pickle.loads(buffer)
         logging.debug("Loaded object as python pickle")
         return obj
-
-    finally:
+    except Exception:
+        # Unpickling foreign data can fail in any number of ways
         pass
-    raise Exception("Unknown format.")
+    raise IOError("Unknown asset format")
+
+
+def _asset_type(obj):
+    """The type an asset is stored as, as recorded in the index."""
+    if hasattr(obj, "_dent_asset_save_binary") or hasattr(obj, "_dent_asset_save"):
+        return type(obj).__name__
+    if type(obj) in [np.ndarray]:
+        return "numpy"
+    return "pickle"
 
 
 def saveToFile(obj, filename, assetName="<unknown>"):
-    if hasattr(obj, "_dent_asset_save"):
-        datastore = tarfile.open(filename, "w")
-        obj._dent_asset_save(datastore)
-        datastore.close()
-        asset_type = type(obj).__name__
-    elif type(obj) in [np.ndarray]:
-        logging.debug("Saving object as numpy array")
-        np.save(open(filename, "wb"), obj)
-        asset_type = "numpy"
+    """Saves an asset to file, returning a metadata record describing it.
+
+    The record holds the asset's name, type and size, as well as any information
+    given by the object's ``_dent_asset_metadata`` method."""
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Write to a temporary file and move it into place, so that readers never see a
+    # partially written asset.
+    temporary = "{}.{}-{}.tmp".format(filename, os.getpid(), threading.get_ident())
+    try:
+        if hasattr(obj, "_dent_asset_save_binary"):
+            with open(temporary, "wb") as f:
+                obj._dent_asset_save_binary(f)
+            asset_type = type(obj).__name__
+        elif hasattr(obj, "_dent_asset_save"):
+            datastore = tarfile.open(temporary, "w")
+            obj._dent_asset_save(datastore)
+            datastore.close()
+            asset_type = type(obj).__name__
+        elif type(obj) in [np.ndarray]:
+            logging.debug("Saving object as numpy array")
+            with open(temporary, "wb") as f:
+                np.save(f, obj)
+            asset_type = "numpy"
+        else:
+            logging.debug("Saving object as python pickle")
+            with open(temporary, "wb") as f:
+                pickle.dump(obj, f)
+            asset_type = "pickle"
+        os.replace(temporary, filename)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    record = {
+        "name": assetName,
+        "type": asset_type,
+        "size": os.path.getsize(filename),
+        "source_mtime": None,
+        "saved": time.time(),
+    }
+    if hasattr(obj, "_dent_asset_metadata"):
+        record.update(obj._dent_asset_metadata())
+    return record
+
+
+_source_hashes = {}
+
+
+def _hash_source(path, stat):
+    """Hashes the contents of a source file, remembering the result for as long as
+    the file's modification time and size are unchanged."""
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if key not in _source_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 ** 2), b""):
+                digest.update(block)
+        _source_hashes[key] = digest.hexdigest()
+    return _source_hashes[key]
+
+
+def _describe_sources(sources):
+    """Records the modification time, size and content hash of each source file."""
+    description = {}
+    for path in sources:
+        stat = os.stat(path)
+        description[path] = [stat.st_mtime, stat.st_size, _hash_source(path, stat)]
+    return description
+
+
+def _generator_name(function):
+    if function is None:
+        return None
+    return "{}.{}".format(
+        getattr(function, "__module__", None),
+        getattr(function, "__qualname__", type(function).__name__),
+    )
+
+
+def _is_stale(record, sources, function):
+    """Checks whether a stored asset is out of date.
+
+    An asset is out of date if it was made by a different generator, from a
+    different set of source files, or if any of its source files has changed.  A
+    source whose modification time has changed but whose contents have not does not
+    make the asset stale (its recorded modification time is refreshed instead)."""
+    recorded = record.get("sources") or {}
+    if sources and set(sources) != set(recorded):
+        return True
+    generator = _generator_name(function)
+    if generator and record.get("generator") and record["generator"] != generator:
+        return True
+
+    touched = False
+    for path, (mtime, size, digest) in list(recorded.items()):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        if stat.st_mtime == mtime and stat.st_size == size:
+            continue
+        if stat.st_size != size or _hash_source(path, stat) != digest:
+            return True
+        recorded[path] = [stat.st_mtime, size, digest]
+        touched = True
+    if touched and record["id"] in get_index():
+        get_index().update(record["id"], sources=recorded)
+    return False
+
+
+def _normalise(sources):
+    """Puts source paths in one canonical form, relative to the store's directory,
+    so that absolute and relative paths to the same file match."""
+    return tuple(os.path.relpath(os.path.abspath(path)) for path in sources)
+
+
+def is_up_to_date(assetName, sources=(), function=None):
+    """Checks whether an asset is in the store and is not out of date."""
+    sources = _normalise(sources)
+    assetID = getInternalAssetID(assetName)
+    record, packed = _find(assetID)
+    if record is None or not (packed or os.path.exists(get_filename(assetID))):
+        return False
+    return not _is_stale(record, sources, function)
+
+
+def _store(obj, assetID, assetName, sources=(), function=None):
+    """Saves an asset into the store, recording it in the index.
+
+    The index record is only appended once the asset file is completely written."""
+    start = time.time()
+    record = saveToFile(obj, get_filename(assetID), assetName)
+    record["id"] = assetID
+    record["sources"] = _describe_sources(sources)
+    record["source_mtime"] = max(
+        [mtime for mtime, _, _ in record["sources"].values()], default=None
+    )
+    record["generator"] = _generator_name(function)
+    previous = get_index().get(assetID)
+    if previous is not None and "owner" in previous:
+        record["owner"] = previous["owner"]
+    get_index().add(record)
+    cache.put(assetID, obj, record["size"])
+    stats.add(
+        assetName,
+        "save",
+        "generator" if function is not None else "explicit",
+        record["type"],
+        time.time() - start,
+        record["size"],
+    )
+    if store_limit is not None:
+        enforce_store_limit(keep=(assetID,))
+
+
+def flush_access_times():
+    """Writes the times assets were last requested into the index."""
+    index = get_index()
+    for assetID, accessed in list(_accessed.items()):
+        if assetID in index:
+            index.update(assetID, accessed=accessed)
+    _accessed.clear()
+
+
+def _last_access(record):
+    return _accessed.get(
+        record["id"], record.get("accessed", record.get("saved", 0))
+    )
+
+
+def _remove(assetID):
+    """Deletes an asset's loose file and index record, returning the bytes freed."""
+    filename = get_filename(assetID)
+    freed = 0
+    if os.path.exists(filename):
+        freed = os.path.getsize(filename)
+        os.remove(filename)
+    get_index().remove(assetID)
+    cache.invalidate(assetID)
+    _accessed.pop(assetID, None)
+    return freed
+
+
+def set_store_limit(limit):
+    """Sets the number of bytes of (loose) asset files the store may hold.
+
+    When the store grows past the limit, the least recently used assets are deleted.
+    A limit of None removes the limit.  Returns the number of bytes freed."""
+    global store_limit
+    store_limit = limit
+    return enforce_store_limit()
+
+
+def enforce_store_limit(keep=()):
+    """Deletes the least recently used assets until the store fits its limit.
+
+    Only loose asset files count towards the limit, and only they are deleted.
+    Assets in `keep` are never deleted.  Returns the number of bytes freed."""
+    if store_limit is None:
+        return 0
+    records = [
+        record
+        for record in get_index().records()
+        if os.path.exists(get_filename(record["id"]))
+    ]
+    total = sum(record["size"] for record in records)
+    if total <= store_limit:
+        return 0
+    freed = 0
+    for record in sorted(records, key=_last_access):
+        if total - freed <= store_limit:
+            break
+        if record["id"] not in keep:
+            logging.info("Evicting asset '%s' from the store", record["name"])
+            freed += _remove(record["id"])
+    return freed
+
+
+def set_references(assetName, names):
+    """Records that an asset refers to (and owns) the assets called `names`.
+
+    An owned asset is only kept by `collect_garbage` while its owner is kept and
+    still refers to it.  Assets only held in the pack are left as they are."""
+    index = get_index()
+    assetID = getInternalAssetID(assetName)
+    if assetID not in index:
+        return
+    references = [getInternalAssetID(name) for name in names]
+    if index.get(assetID).get("references") != references:
+        index.update(assetID, references=references)
+    for reference in references:
+        record = index.get(reference)
+        if record is not None and record.get("owner") != assetID:
+            index.update(reference, owner=assetID)
+
+
+def _is_present(assetID):
+    """Whether an asset is held in the store, as a loose file or in the pack."""
+    pack = get_pack()
+    return os.path.exists(get_filename(assetID)) or (
+        pack is not None and assetID in pack
+    )
+
+
+def _is_live(record, records, live):
+    """Whether an asset is still needed.  An asset is needed if all its source files
+    exist or, for an owned asset, if its owner is needed and still refers to it.
+
+    `records` maps asset IDs to the records of all the assets in the store, loose or
+    packed."""
+    if record["id"] in live:
+        return live[record["id"]]
+    live[record["id"]] = False
+    if not _is_present(record["id"]):
+        result = False
+    elif "owner" in record:
+        owner = records.get(record["owner"])
+        result = (
+            owner is not None
+            and record["id"] in owner.get("references", ())
+            and _is_live(owner, records, live)
+        )
+    else:
+        result = all(os.path.exists(path) for path in record.get("sources", {}))
+    live[record["id"]] = result
+    return result
+
+
+def collect_garbage():
+    """Deletes assets that are no longer needed, returning the bytes reclaimed.
+
+    Assets are dropped if a source file they were made from no longer exists (for
+    instance, a renamed model), or if they are owned by an asset that was dropped or
+    no longer refers to them.  Assets only held in the pack are not touched.  The
+    index is then compacted."""
+    flush_access_times()
+    pack = get_pack()
+    records = {}
+    if pack is not None:
+        records.update(
+            (assetID, entry["record"]) for assetID, entry in pack.entries.items()
+        )
+    index_records = list(get_index().records())
+    records.update((record["id"], record) for record in index_records)
+    live = {}
+    freed = 0
+    for record in index_records:
+        loose = os.path.exists(get_filename(record["id"]))
+        if not loose and pack is not None and record["id"] in pack:
+            continue
+        if not _is_live(record, records, live):
+            logging.info("Collecting asset '%s'", record["name"])
+            freed += _remove(record["id"])
+    get_index().compact()
+    return freed
+
+
+def report(count=10):
+    """Returns a report of the time and bytes spent loading and saving assets."""
+    return stats.report(count)
+
+
+def set_cache_budget(budget):
+    """Sets the number of bytes of assets that may be held in memory.
+
+    A budget of zero disables the in-memory asset cache."""
+    cache.set_budget(budget)
+
+
+def invalidate(assetName=None):
+    """Drops an asset (or, if no name is given, all assets) from the in-memory cache.
+
+    The asset store on disk is not affected."""
+    if assetName is None:
+        cache.invalidate()
     else:
-        logging.debug("Saving object as python pickle")
-        pickle.dump(obj, open(filename, "wb"))
-        asset_type = "pickle"
-    with open(filename + ".meta", "w") as f:
-        f.write("{}\n{}\n".format(assetName, asset_type))
+        cache.invalidate(getInternalAssetID(assetName))
+
 
+@contextmanager
+def _locked(assetID):
+    """Holds the lock of an asset, both among threads and among processes.
 
-def getAsset(assetName, function=None, args=(), forceReload=False, type_hint=None):
+    The lock is reentrant within a thread, so a generator may request its own asset.
+    Locking among processes uses a byte range (chosen by the asset ID) of the store's
+    lock file, and is skipped where `fcntl` is unavailable."""
+    global _lock_file
+    with _asset_locks_lock:
+        lock = _asset_locks.setdefault(assetID, threading.RLock())
+    with lock:
+        held = _held.__dict__.setdefault("ids", set())
+        if fcntl is None or assetID in held:
+            yield
+            return
+        with _asset_locks_lock:
+            # Record locks belong to a process, so each process needs its own file.
+            if _lock_file is None or _lock_file[0] != os.getpid():
+                _lock_file = (os.getpid(), open(LOCK_FILENAME, "a+b"))
+            lock_file = _lock_file[1]
+        offset = int(assetID[:8], 16)
+        fcntl.lockf(lock_file, fcntl.LOCK_EX, 1, offset)
+        held.add(assetID)
+        try:
+            yield
+        finally:
+            held.discard(assetID)
+            fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, offset)
+
+
+def getAsset(
+    assetName, function=None, args=(), forceReload=False, type_hint=None, sources=()
+):
+    """Loads an asset from the store, generating it if required.
+
+    If the asset is not in the store (or `forceReload` is set), it is generated by
+    calling `function` with `args` and saved.  `sources` lists the files the asset is
+    made from: if any of them change (or the generating function does), the asset is
+    regenerated the next time it is requested.
+    """
     logging.info("Loading asset '{}'".format(assetName))
+    start = time.time()
+    sources = _normalise(sources)
     assetID = getInternalAssetID(assetName)
+    _accessed[assetID] = time.time()
     if forceReload and function is None:
         raise Exception("Must specify generation function if reloading asset.")
 
-    filename = get_filename(assetID)
-    if os.path.exists(filename) and not forceReload:
-        return loadFromFile(filename, type_hint)
+    with _locked(assetID):
+        record, packed = _find(assetID)
+        if not forceReload and record is not None and function is not None:
+            if _is_stale(record, sources, function):
+                # Another process may have regenerated the asset already.
+                get_index().refresh()
+                record, packed = _find(assetID)
+                if record is None or _is_stale(record, sources, function):
+                    logging.info("Asset '%s' is out of date, regenerating", assetName)
+                    forceReload = True
 
-    if not function:
-        raise Exception("Asset {} not found".format(assetName))
+        if not forceReload:
+            obj = cache.get(assetID, _MISSING)
+            if obj is not _MISSING:
+                stats.add(
+                    assetName, "load", "cache", _asset_type(obj), time.time() - start
+                )
+                return obj
 
-    obj = function(*args)
+        filename = get_filename(assetID)
+        if not forceReload and (packed or os.path.exists(filename)):
+            try:
+                if packed:
+                    obj = loadFromBuffer(get_pack().read(assetID), type_hint)
+                else:
+                    obj = loadFromFile(filename, type_hint)
+                size = record["size"] if record else os.path.getsize(filename)
+                cache.put(assetID, obj, size)
+                stats.add(
+                    assetName,
+                    "load",
+                    "pack" if packed else "file",
+                    record["type"] if record else _asset_type(obj),
+                    time.time() - start,
+                    size,
+                )
+                return obj
+            except (IOError, ValueError):
+                # Truncated arrays fail to map with a ValueError
+                if not function:
+                    raise
+                logging.warning("Asset '%s' is unreadable, regenerating", assetName)
 
-    saveToFile(obj, filename, assetName)
+        if not function:
+            raise Exception("Asset {} not found".format(assetName))
 
-    return obj
+        obj = function(*args)
+        stats.add(
+            assetName, "load", "generator", _asset_type(obj), time.time() - start
+        )
 
+        _store(obj, assetID, assetName, sources, function)
 
-def saveAsset(assetName, value):
-    assetID = getInternalAssetID(assetName)
-    filename = get_filename(assetID)
-    saveToFile(value, filename, assetName)
+        return obj
+
+
+def getAssetAsync(
+    assetName,
+    function=None,
+    args=(),
+    forceReload=False,
+    type_hint=None,
+    sources=(),
+    priority=0,
+    callback=None,
+):
+    """Loads an asset on the asset loader's worker threads.
+
+    Takes the same arguments as `getAsset`, and returns a future for the asset.
+    Assets with a higher `priority` are loaded first.  If a `callback` is given, it is
+    called on the main thread with the asset once it has loaded."""
+    return loader.submit(
+        getAsset,
+        (assetName, function, args, forceReload, type_hint, sources),
+        priority,
+        callback,
+    )
+
+
+def saveAsset(assetName, value, sources=()):
+    _store(value, getInternalAssetID(assetName), assetName, _normalise(sources))
 
 
 def getAllAssetIds():
-    return [i for i in sorted(os.listdir("_assets")) if "meta" not in i]
+    pack = get_pack()
+    if pack is None:
+        return get_index().ids()
+    return sorted(set(get_index().ids()) | set(pack.entries))
 
 
 def getAssetName(assetID):
@@ -0,0 +1,183 @@
+"""Offline asset baking.
+
+Baking builds, ahead of time, the assets that loading a game's models would otherwise
+create at runtime: meshes, materials, bone tables and texture images.  This is what
+``dent-assets bake`` runs, so that a shipped game never has to import models through
+pyassimp on a player's first launch.
+
+Models are baked with the asset names a :class:`dent.Object.Object` would use (those
+derived from the model's filename).  The load options the game gives its objects
+(such as ``optimise_meshes``, ``lod_levels``, ``vertex_format`` and
+``static_batching``) must be given to the bake too, so that it builds the assets
+those options ask for.  No graphics context is needed.
+"""
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+import dent.assets
+import dent.Object
+import dent.Texture
+import dent.TextureManager
+from dent.Material import Material
+
+MODEL_EXTENSIONS = (".fbx", ".obj", ".dae", ".3ds", ".blend", ".ply", ".stl")
+
+BakedAsset = namedtuple("BakedAsset", ("name", "status", "seconds", "size"))
+
+
+def find_models(paths):
+    """Finds all model files in the given files and (recursively) directories."""
+    models = []
+    for path in paths:
+        if os.path.isfile(path):
+            models.append(os.path.normpath(path))
+            continue
+        for directory, subdirectories, filenames in os.walk(path):
+            subdirectories[:] = sorted(
+                i for i in subdirectories if i != "_assets" and not i.startswith(".")
+            )
+            models.extend(
+                os.path.normpath(os.path.join(directory, filename))
+                for filename in sorted(filenames)
+                if filename.lower().endswith(MODEL_EXTENSIONS)
+            )
+    return models
+
+
+def _model_asset_names(filename):
+    """Lists the assets built for a model, if its mesh info and material names are
+    already in the store."""
+    name = os.path.basename(filename)
+    mesh_info = dent.assets.getAsset(name + "-mesh_info")
+    material_names = dent.assets.getAsset(name + "-material-names")
+    if mesh_info is None or material_names is None:
+        return None
+    return (
+        [name + "-mesh_info", name + "-material-names", name + "-bones"]
+        + [mesh[0] for mesh in mesh_info]
+        + [name + "-material-" + material for material in material_names]
+    )
+
+
+def model_up_to_date(filename):
+    sources = (filename,)
+    name = os.path.basename(filename)
+    for asset in (name + "-mesh_info", name + "-material-names"):
+        if not dent.assets.is_up_to_date(asset, sources):
+            return False
+    names = _model_asset_names(filename)
+    return names is not None and all(
+        dent.assets.is_up_to_date(asset, sources) for asset in names
+    )
+
+
+def get_texture_paths(filename):
+    """Lists the texture files used by a (baked) model's materials."""
+    name = os.path.basename(filename)
+    material_names = dent.assets.getAsset(name + "-material-names")
+    paths = []
+    for material in material_names or []:
+        paths.extend(
+            dent.assets.getAsset(
+                name + "-material-" + material, type_hint=Material
+            ).texture_paths()
+        )
+    return paths
+
+
+def _saved_since(start, belongs):
+    """Reports the assets saved since `start` whose names satisfy `belongs`.
+
+    The time given for each is that since the previous asset was saved, which (as
+    assets are saved as soon as they are built) is roughly the time to build it."""
+    records = sorted(
+        [
+            record
+            for record in dent.assets.get_index().records()
+            if record["saved"] >= start and belongs(record["name"])
+        ],
+        key=lambda record: record["saved"],
+    )
+    baked = []
+    for record in records:
+        baked.append(
+            BakedAsset(record["name"], "built", record["saved"] - start, record["size"])
+        )
+        start = record["saved"]
+    return baked
+
+
+def bake_model(filename, options=None):
+    """Builds all the assets for a model, unless they are already up to date.
+
+    `options` are the keyword arguments of :class:`dent.Object.Object` the model is
+    loaded with in the game."""
+    options = options or {}
+    start = time.time()
+    try:
+        # The assets made by load options are not listed by the model's mesh info,
+        # so are checked by loading the model, which only builds what is missing.
+        if not options and model_up_to_date(filename):
+            return [BakedAsset(filename, "up to date", time.time() - start, 0)]
+        dent.Object.Object(filename, daemon=False, shader_name=None, **options)
+    except Exception:
+        logging.exception("Could not bake %s", filename)
+        return [BakedAsset(filename, "failed", time.time() - start, 0)]
+    prefix = os.path.basename(filename) + "-"
+    baked = _saved_since(start, lambda name: name.startswith(prefix))
+    if not baked:
+        return [BakedAsset(filename, "up to date", time.time() - start, 0)]
+    return baked
+
+
+def bake_texture(path):
+    """Builds the image asset for a texture file, unless it is already up to date."""
+    start = time.time()
+    try:
+        if dent.assets.is_up_to_date(path, (path,), dent.Texture.read_image):
+            return [BakedAsset(path, "up to date", time.time() - start, 0)]
+        dent.TextureManager.get_image(path)
+    except Exception:
+        logging.exception("Could not bake %s", path)
+        return [BakedAsset(path, "failed", time.time() - start, 0)]
+    return _saved_since(start, lambda name: name == path)
+
+
+def bake(paths, processes=None, report=lambda asset: None, options=None):
+    """Bakes the assets for every model found in `paths`, and their textures.
+
+    The work is spread over a pool of `processes` worker processes (by default, one
+    per CPU).  Models are loaded with the :class:`dent.Object.Object` keyword
+    arguments `options`.  `report` is called with a `BakedAsset` for each asset
+    built, and for each model or texture that was already up to date or failed to
+    bake.  Returns the list of all these.
+    """
+    dent.assets.initialise()
+    models = find_models(paths)
+    baked = []
+    with multiprocessing.Pool(processes) as pool:
+        for assets in pool.imap_unordered(
+            functools.partial(bake_model, options=options), models
+        ):
+            for asset in assets:
+                report(asset)
+            baked.extend(assets)
+
+        dent.assets.get_index().refresh()
+        dent.assets.invalidate()
+        textures = set()
+        for model in models:
+            if dent.assets.is_up_to_date(
+                os.path.basename(model) + "-material-names", (model,)
+            ):
+                textures.update(get_texture_paths(model))
+
+        for assets in pool.imap_unordered(bake_texture, sorted(textures)):
+            for asset in assets:
+                report(asset)
+            baked.extend(assets)
+    return baked
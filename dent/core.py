@@ -4,6 +4,7 @@ import sys
 if getattr(sys, "frozen", False):
     os.chdir(sys._MEIPASS)
 
+import atexit
 import time
 import logging
 import numpy as np
@@ -37,6 +38,21 @@ import dent.debug
 
 from . import assets
 assets.initialise()
+if args.args.loader_workers is not None:
+    assets.loader.workers = args.args.loader_workers
+atexit.register(assets.flush_access_times)
+
+
+def write_asset_report():
+    if args.args.asset_report == "-":
+        print(assets.report())
+    else:
+        with open(args.args.asset_report, "w") as f:
+            f.write(assets.report() + "\n")
+
+
+if args.args.asset_report:
+    atexit.register(write_asset_report)
 
 windowHeight = 512
 windowWidth = 512
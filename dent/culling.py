@@ -0,0 +1,112 @@
+"""View frustum culling.
+
+A :class:`Frustum` holds the six planes of a view volume, taken from the combined
+view and projection matrix (in the row vector convention of :mod:`dent.transforms`,
+so a point ``p`` is in view if ``[p, 1] . view . projection`` lies in the clip
+cube).  The plane of each face is a sum or difference of two columns of that matrix
+(Gribb and Hartmann, "Fast Extraction of Viewing Frustum Planes from the
+World-View-Projection Matrix", 2001).
+
+The frustum of the pass being drawn is kept in `current_frustum`.  A pass may set
+it before drawing a scene, as the shadow cascades do.  Otherwise the scene sets it
+from its camera's view and `projection` while drawing its objects, so that every
+pass draws only what it can see.  If it is None, nothing is culled.
+"""
+import numpy as np
+
+current_frustum = None
+
+
+class CullingStats(object):
+    """Counts the bounding volumes drawn and culled in each pass.  Passes reset
+    their counts before they draw, so these are the counts of the last frame."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, name, visible, culled):
+        counts = self.counts.setdefault(name, [0, 0])
+        counts[0] += visible
+        counts[1] += culled
+
+    def visible(self, name=None):
+        return sum(
+            counts[0] for key, counts in self.counts.items() if name in (None, key)
+        )
+
+    def culled(self, name=None):
+        return sum(
+            counts[1] for key, counts in self.counts.items() if name in (None, key)
+        )
+
+    def reset(self, name=None):
+        """Clears the counts of a pass, or of every pass if `name` is None."""
+        if name is None:
+            self.counts = {}
+        else:
+            self.counts.pop(name, None)
+
+
+stats = CullingStats()
+
+
+def transform_spheres(centres, radii, model):
+    """Moves bounding spheres by a model matrix.
+
+    The radii grow by the largest scale of the matrix, so the spheres still bound
+    their meshes under non uniform scales."""
+    model = np.asarray(model, dtype=np.float64)
+    centres = np.asarray(centres, dtype=np.float64).reshape((-1, 3))
+    scale = np.linalg.norm(model[:3, :3], axis=1).max()
+    return centres.dot(model[:3, :3]) + model[3, :3], np.asarray(radii) * scale
+
+
+class Frustum(object):
+    """The planes bounding the view of a camera, for culling.
+
+    Args:
+        matrix: The combined view and projection matrix.
+        name (str): The name of the pass this frustum draws, for the counters in
+            `stats`.
+    """
+
+    def __init__(self, matrix, name="main"):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        w = matrix[:, 3]
+        planes = np.array(
+            [
+                w + matrix[:, 0],
+                w - matrix[:, 0],
+                w + matrix[:, 1],
+                w - matrix[:, 1],
+                w + matrix[:, 2],
+                w - matrix[:, 2],
+            ]
+        )
+        # Normalise the planes so that they give true distances
+        planes /= np.linalg.norm(planes[:, :3], axis=1)[:, np.newaxis]
+        self.planes = planes
+        self.name = name
+
+    @classmethod
+    def from_view_projection(cls, view, projection, name="main"):
+        return cls(np.dot(view, projection), name)
+
+    def test_spheres(self, centres, radii):
+        """Returns which of the given spheres are (at least partly) inside the
+        frustum."""
+        centres = np.asarray(centres, dtype=np.float64).reshape((-1, 3))
+        radii = np.asarray(radii, dtype=np.float64).reshape((-1, 1))
+        distances = centres.dot(self.planes[:, :3].T) + self.planes[:, 3]
+        return np.all(distances >= -radii, axis=1)
+
+    def test_sphere(self, centre, radius):
+        return bool(self.test_spheres(centre, radius)[0])
+
+    def cull(self, items, centres, radii):
+        """Returns the items whose bounding spheres are inside the frustum,
+        counting those kept and dropped."""
+        visible = self.test_spheres(centres, radii)
+        kept = [item for item, keep in zip(items, visible) if keep]
+        stats.add(self.name, len(kept), len(items) - len(kept))
+        return kept
@@ -0,0 +1,136 @@
+"""Levels of detail for meshes.
+
+Simplified versions of a mesh are made by vertex clustering (Lindstrom, "Out-of-Core
+Simplification of Large Polygonal Models", 2000): vertices are gathered into the
+cells of a uniform grid, each cell is collapsed to the point minimising the sum of
+the quadric errors of the faces around it, and triangles that collapse are dropped.
+This is far faster than greedy edge collapse, so it is cheap enough to run over
+every mesh at asset build time.
+
+At runtime, a level of detail is chosen from the angular size of an object as seen
+from the camera, with some hysteresis so that objects do not flicker between levels
+when they sit at a threshold.
+"""
+import numpy as np
+
+from dent import meshopt
+from dent.Mesh import Mesh, narrow_indices
+
+DEFAULT_THRESHOLDS = (0.2, 0.1, 0.05, 0.025)
+DEFAULT_HYSTERESIS = 0.1
+
+
+def resolution(mesh, level):
+    """The grid resolution (cells along the longest axis) for a level of detail.
+
+    Each level roughly quarters the vertex count of a surface."""
+    return max(2, int(np.sqrt(len(mesh.data)) / 2 ** level))
+
+
+def _face_quadrics(positions, triangles):
+    """The area weighted error quadric of the plane of each triangle."""
+    p0, p1, p2 = (positions[triangles[:, i]] for i in range(3))
+    normals = np.cross(p1 - p0, p2 - p0)
+    areas = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(areas, 1e-30)[:, np.newaxis]
+    planes = np.concatenate(
+        [normals, -np.einsum("ij,ij->i", normals, p0)[:, np.newaxis]], axis=1
+    )
+    return areas[:, np.newaxis, np.newaxis] * np.einsum("ij,ik->ijk", planes, planes)
+
+
+def simplify(mesh, grid_resolution, name=None):
+    """Returns a simplified copy of a mesh, clustered on a grid of the given
+    resolution.
+
+    Each cluster keeps the vertex attributes of the original vertex nearest its new
+    position."""
+    positions = np.asarray(mesh.data["position"], dtype=np.float64)
+    triangles = np.asarray(mesh.indices).reshape((-1, 3)).astype(np.int64)
+
+    low = positions.min(axis=0)
+    cell_size = max((positions.max(axis=0) - low).max(), 1e-12) / grid_resolution
+    cells = np.minimum(
+        np.floor((positions - low) / cell_size).astype(np.int64), grid_resolution - 1
+    )
+    keys = (cells[:, 0] * grid_resolution + cells[:, 1]) * grid_resolution + cells[
+        :, 2
+    ]
+    _, cluster = np.unique(keys, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    clusters = cluster.max() + 1 if len(cluster) else 0
+
+    # Sum the quadrics of the faces around each cluster
+    face_quadrics = _face_quadrics(positions, triangles).reshape((-1, 16))
+    quadrics = np.zeros((clusters, 16))
+    for corner in range(3):
+        for component in range(16):
+            quadrics[:, component] += np.bincount(
+                cluster[triangles[:, corner]],
+                weights=face_quadrics[:, component],
+                minlength=clusters,
+            )
+    quadrics = quadrics.reshape((-1, 4, 4))
+
+    # Find the point of least error in each cluster.  Flat and degenerate regions
+    # have no unique such point, so there is a small pull towards the centroid.
+    counts = np.bincount(cluster, minlength=clusters)
+    sums = [np.bincount(cluster, positions[:, i], minlength=clusters) for i in range(3)]
+    centroids = np.stack(sums, axis=1) / np.maximum(counts, 1)[:, np.newaxis]
+    regularisation = 1e-3 * np.trace(quadrics[:, :3, :3], axis1=1, axis2=2) / 3 + 1e-12
+    a = quadrics[:, :3, :3] + regularisation[:, np.newaxis, np.newaxis] * np.eye(3)
+    b = -quadrics[:, :3, 3] + regularisation[:, np.newaxis] * centroids
+    optimal = np.linalg.solve(a, b[:, :, np.newaxis])[:, :, 0]
+
+    # Keep the vertex nearest each cluster's point
+    distances = np.linalg.norm(positions - optimal[cluster], axis=1)
+    order = np.lexsort((distances, cluster))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cluster[order][1:] != cluster[order][:-1]
+    data = mesh.data[order[first]].copy()
+    data["position"] = optimal
+
+    # Remap the triangles, dropping those that collapse and duplicates
+    triangles = cluster[triangles]
+    triangles = triangles[
+        (triangles[:, 0] != triangles[:, 1])
+        & (triangles[:, 1] != triangles[:, 2])
+        & (triangles[:, 2] != triangles[:, 0])
+    ]
+    rotation = (np.argmin(triangles, axis=1)[:, np.newaxis] + np.arange(3)) % 3
+    _, unique = np.unique(
+        np.take_along_axis(triangles, rotation, axis=1), axis=0, return_index=True
+    )
+    indices = triangles[np.sort(unique)].reshape(-1)
+    data, indices = meshopt.optimise_vertex_fetch(data, indices)
+    indices = narrow_indices(indices, len(data))
+
+    simplified = Mesh(name or mesh.name, mesh._transform, mesh.offset, mesh.directory)
+    simplified.data = data
+    simplified.indices = indices
+    simplified.material_name = mesh.material_name
+    simplified.compute_bounds()
+    return simplified
+
+
+def angular_size(centre, radius, camera_position):
+    """The (approximate) angular radius of a sphere seen from the camera."""
+    distance = np.linalg.norm(np.asarray(centre) - np.asarray(camera_position))
+    if distance <= radius:
+        return np.inf
+    return radius / distance
+
+
+def select_lod(
+    size, current, thresholds=DEFAULT_THRESHOLDS, hysteresis=DEFAULT_HYSTERESIS
+):
+    """Chooses the level of detail for an object of the given angular size.
+
+    Level ``i + 1`` is used below ``thresholds[i]``.  To move between levels, the
+    size must pass the threshold by a fraction `hysteresis` of it."""
+    level = min(current, len(thresholds))
+    while level > 0 and size > thresholds[level - 1] * (1 + hysteresis):
+        level -= 1
+    while level < len(thresholds) and size < thresholds[level] * (1 - hysteresis):
+        level += 1
+    return level
@@ -0,0 +1,136 @@
+"""Mesh optimisation for faster rendering.
+
+This reorders the triangles of a mesh so that vertices are reused while they are
+still in the GPU's post-transform vertex cache (using the Tipsify algorithm of
+Sander, Nehab and Barczak, "Fast Triangle Reordering for Vertex Locality and
+Reduced Overdraw", 2007), and then reorders the vertices into the order they are
+first used, so that vertex fetches run through memory sequentially.
+
+The effect on the vertex cache is measured by the average cache miss ratio (ACMR):
+the number of vertices transformed per triangle drawn.  This is at most 3, and
+around 0.5 to 0.7 for well ordered meshes.
+"""
+import logging
+from collections import deque
+
+import numpy as np
+
+from dent.Mesh import Mesh, narrow_indices
+
+DEFAULT_CACHE_SIZE = 16
+
+
+def acmr(indices, cache_size=DEFAULT_CACHE_SIZE):
+    """Computes the average cache miss ratio of a triangle list with a FIFO cache."""
+    cache = deque()
+    cached = set()
+    misses = 0
+    for vertex in np.asarray(indices).reshape(-1).tolist():
+        if vertex in cached:
+            continue
+        misses += 1
+        cache.append(vertex)
+        cached.add(vertex)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    triangles = len(indices) // 3
+    return misses / triangles if triangles else 0.
+
+
+def tipsify(indices, vertex_count, cache_size=DEFAULT_CACHE_SIZE):
+    """Reorders the triangles of a triangle list for vertex cache locality.
+
+    Returns a new index array, with the same triangles (and winding) as `indices`."""
+    indices = np.asarray(indices)
+    triangles = indices.reshape((-1, 3))
+    flat = triangles.reshape(-1)
+
+    # The triangles using each vertex are adjacency[offsets[v]:offsets[v + 1]]
+    counts = np.bincount(flat, minlength=vertex_count)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    adjacency = (np.argsort(flat, kind="stable") // 3).tolist()
+    triangle_list = triangles.tolist()
+
+    live = counts.tolist()
+    cache_time = [0] * vertex_count
+    emitted = bytearray(len(triangle_list))
+    dead_end = []
+    order = []
+    time = cache_size + 1
+    cursor = 0
+    fan = 0 if vertex_count else -1
+
+    while fan >= 0:
+        candidates = []
+        for triangle in adjacency[offsets[fan] : offsets[fan + 1]]:
+            if emitted[triangle]:
+                continue
+            for vertex in triangle_list[triangle]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if time - cache_time[vertex] > cache_size:
+                    cache_time[vertex] = time
+                    time += 1
+            emitted[triangle] = 1
+            order.append(triangle)
+
+        # Fan next around the candidate that will still be in the cache after its
+        # remaining triangles are emitted, and has been in the cache the longest.
+        fan = -1
+        best = -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                priority = 0
+                if time - cache_time[vertex] + 2 * live[vertex] <= cache_size:
+                    priority = time - cache_time[vertex]
+                if priority > best:
+                    best = priority
+                    fan = vertex
+        if fan >= 0:
+            continue
+        while dead_end:
+            vertex = dead_end.pop()
+            if live[vertex] > 0:
+                fan = vertex
+                break
+        if fan >= 0:
+            continue
+        while cursor < vertex_count:
+            if live[cursor] > 0:
+                fan = cursor
+                break
+            cursor += 1
+
+    return triangles[np.array(order, dtype=np.int64)].reshape(-1)
+
+
+def optimise_vertex_fetch(data, indices):
+    """Reorders vertices into the order the triangles first use them.
+
+    Vertices no triangle uses are dropped.  Returns the new vertex data and indices."""
+    indices = np.asarray(indices)
+    used, first = np.unique(indices, return_index=True)
+    used = used[np.argsort(first)]
+    remap = np.zeros(len(data), dtype=indices.dtype)
+    remap[used] = np.arange(len(used))
+    return data[used], remap[indices]
+
+
+def optimise(mesh, cache_size=DEFAULT_CACHE_SIZE, name=None):
+    """Returns a copy of a mesh with its triangles and vertices reordered, named
+    `name` if it is given."""
+    before = acmr(mesh.indices, cache_size)
+    indices = tipsify(mesh.indices, len(mesh.data), cache_size)
+    data, indices = optimise_vertex_fetch(mesh.data, indices)
+    optimised = Mesh(name or mesh.name, mesh._transform, mesh.offset, mesh.directory)
+    optimised.data = data
+    optimised.indices = narrow_indices(indices, len(data))
+    optimised.material_name = mesh.material_name
+    optimised.compute_bounds()
+    logging.info(
+        "Optimised mesh {}: ACMR {:.3f} -> {:.3f}".format(
+            mesh.name, before, acmr(indices, cache_size)
+        )
+    )
+    return optimised
@@ -10,6 +10,9 @@ handled_messages = []
 messages = deque()
 handlers = {}
 replaying = False
+# Events are messages that are handled but never recorded or replayed, such as the
+# progress of background loading, which may happen before the game starts.
+events = deque()
 
 class Message(object):
   def __init__(self, message_type, data=()):
@@ -26,6 +29,11 @@ def add_message(message):
     return
   messages.append(message)
 
+def add_event(message):
+  """Adds a message that is handled as soon as messages are next processed, but is
+  not recorded for replays.  This is safe to call from any thread."""
+  events.append(message)
+
 def add_handler(message_type, handler):
   if message_type not in handlers:
     handlers[message_type] = []
@@ -45,6 +53,10 @@ def process_messages():
     else:
       messages.appendleft(message)
       break
+  while len(events):
+    message = events.popleft()
+    for handler in handlers.get(message.type, ()):
+      handler(*message.data)
 
 def game_start_handler(time):
   global handled_messages
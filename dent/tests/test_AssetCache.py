@@ -0,0 +1,61 @@
+from dent.AssetCache import AssetCache
+
+def test_virgin_empty():
+  c = AssetCache(100)
+  assert len(c) == 0
+  assert c.bytes == 0
+  assert c.get('a') is None
+  assert c.misses == 1
+
+def test_hit():
+  c = AssetCache(100)
+  c.put('a', 'value', 10)
+  assert c.get('a') == 'value'
+  assert c.hits == 1
+  assert c.bytes == 10
+
+def test_least_recently_used_evicted():
+  c = AssetCache(30)
+  for i in range(3):
+    c.put(i, i, 10)
+  c.get(0)
+  c.put(3, 3, 10)
+  assert 1 not in c
+  for i in (0, 2, 3):
+    assert i in c
+  assert c.evictions == 1
+  assert c.bytes == 30
+
+def test_oversized_not_cached():
+  c = AssetCache(30)
+  c.put('a', 'a', 10)
+  c.put('big', 'big', 31)
+  assert 'big' not in c
+  assert 'a' in c
+
+def test_replacing_updates_size():
+  c = AssetCache(30)
+  c.put('a', 'a', 10)
+  c.put('a', 'b', 20)
+  assert len(c) == 1
+  assert c.bytes == 20
+  assert c.get('a') == 'b'
+
+def test_invalidate():
+  c = AssetCache(30)
+  c.put('a', 'a', 10)
+  c.put('b', 'b', 10)
+  c.invalidate('a')
+  assert 'a' not in c
+  assert c.bytes == 10
+  c.invalidate()
+  assert len(c) == 0
+  assert c.bytes == 0
+
+def test_shrinking_budget_evicts():
+  c = AssetCache(30)
+  for i in range(3):
+    c.put(i, i, 10)
+  c.set_budget(10)
+  assert len(c) == 1
+  assert 2 in c
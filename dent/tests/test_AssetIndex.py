@@ -0,0 +1,72 @@
+from dent.AssetIndex import AssetIndex
+
+def record(asset_id, **fields):
+  fields.update({'id': asset_id, 'name': 'asset-' + asset_id, 'type': 'pickle'})
+  return fields
+
+def test_virgin_empty(tmpdir):
+  index = AssetIndex(str(tmpdir.join('index.log')))
+  assert len(index) == 0
+  assert index.get('a') is None
+
+def test_persistence(tmpdir):
+  filename = str(tmpdir.join('index.log'))
+  index = AssetIndex(filename)
+  index.add(record('a', size=10))
+  index.add(record('b', size=20))
+  index.add(record('a', size=30))
+  index.remove('b')
+  reopened = AssetIndex(filename)
+  assert reopened.ids() == ['a']
+  assert reopened.get('a')['size'] == 30
+
+def test_sees_records_from_other_writers(tmpdir):
+  filename = str(tmpdir.join('index.log'))
+  reader = AssetIndex(filename)
+  AssetIndex(filename).add(record('a'))
+  assert 'a' in reader
+
+def test_torn_line_ignored(tmpdir):
+  filename = str(tmpdir.join('index.log'))
+  AssetIndex(filename).add(record('a'))
+  with open(filename, 'a') as f:
+    f.write('{"id": "b", "na')
+  index = AssetIndex(filename)
+  assert index.ids() == ['a']
+
+def test_update(tmpdir):
+  index = AssetIndex(str(tmpdir.join('index.log')))
+  index.add(record('a', size=10))
+  index.update('a', size=20)
+  assert index.get('a')['size'] == 20
+  assert index.get('a')['name'] == 'asset-a'
+
+def test_compact(tmpdir):
+  filename = str(tmpdir.join('index.log'))
+  index = AssetIndex(filename)
+  for i in range(10):
+    index.add(record('a', size=i))
+  index.add(record('b'))
+  index.compact()
+  assert len(open(filename).readlines()) == 2
+  assert AssetIndex(filename).get('a')['size'] == 9
+
+def test_readers_follow_compaction(tmpdir):
+  filename = str(tmpdir.join('index.log'))
+  index = AssetIndex(filename)
+  other = AssetIndex(filename)
+  for i in range(10):
+    index.add(record('a', size=i))
+  other.add(record('b'))
+  assert 'b' in index
+  index.compact()
+  other.add(record('c'))
+  assert index.get('c') is not None
+  assert index.ids() == ['a', 'b', 'c']
+  other.remove('a')
+  reader = AssetIndex(filename)
+  other.compact()
+  index.add(record('d'))
+  reader.refresh()
+  assert reader.ids() == ['b', 'c', 'd']
+  assert AssetIndex(filename).ids() == ['b', 'c', 'd']
@@ -0,0 +1,43 @@
+import pytest
+from dent.AssetPack import AssetPack, write_pack
+
+def test_round_trip(tmpdir):
+  filename = str(tmpdir.join('assets.pack'))
+  assets = [('a', b'hello', {'name': 'a'}), ('b', b'x' * 1000, {'name': 'b'})]
+  write_pack(filename, assets)
+  pack = AssetPack(filename)
+  assert len(pack) == 2
+  assert 'a' in pack and 'c' not in pack
+  assert bytes(pack.read('a')) == b'hello'
+  assert bytes(pack.read('b')) == b'x' * 1000
+  assert pack.get('b')['record'] == {'name': 'b'}
+
+def test_payloads_aligned(tmpdir):
+  filename = str(tmpdir.join('assets.pack'))
+  write_pack(filename, [(str(i), b'y' * (i + 1), {}) for i in range(5)])
+  pack = AssetPack(filename)
+  for entry in pack.entries.values():
+    assert entry['offset'] % 64 == 0
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma'])
+def test_compressed(tmpdir, codec):
+  filename = str(tmpdir.join('assets.pack'))
+  write_pack(filename, [('a', b'z' * 10000, {})], codec)
+  pack = AssetPack(filename)
+  assert pack.get('a')['stored_size'] < 10000
+  assert bytes(pack.read('a')) == b'z' * 10000
+
+def test_codec_chosen_per_record(tmpdir):
+  filename = str(tmpdir.join('assets.pack'))
+  assets = [('a', b'a' * 100, {'type': 'Mesh'}), ('b', b'b' * 100, {'type': 'dict'})]
+  write_pack(filename, assets, lambda r: 'raw' if r['type'] == 'Mesh' else 'zlib')
+  pack = AssetPack(filename)
+  assert pack.get('a')['codec'] == 'raw'
+  assert pack.get('b')['codec'] == 'zlib'
+
+def test_not_a_pack(tmpdir):
+  filename = str(tmpdir.join('assets.pack'))
+  with open(filename, 'wb') as f:
+    f.write(b'\0' * 64)
+  with pytest.raises(IOError):
+    AssetPack(filename)
@@ -0,0 +1,30 @@
+from dent.AssetStats import AssetStats
+
+def test_bytes_read_excludes_cache_and_saves():
+  s = AssetStats()
+  s.add('a', 'load', 'file', 'numpy', 0.1, 100)
+  s.add('b', 'load', 'pack', 'Mesh', 0.1, 50)
+  s.add('a', 'load', 'cache', 'numpy', 0.0)
+  s.add('c', 'save', 'generator', 'pickle', 0.2, 1000)
+  assert s.bytes_read() == 150
+
+def test_report_lists_slowest_first():
+  s = AssetStats()
+  s.add('fast', 'load', 'file', 'numpy', 0.01, 10)
+  s.add('slow', 'load', 'generator', 'Mesh', 2.0)
+  report = s.report(count=1)
+  assert 'slow' in report
+  assert 'fast' not in report.split('Asset\n')[-1]
+  s.reset()
+  assert s.totals == {}
+
+def test_events_totalled_per_asset():
+  s = AssetStats()
+  for _ in range(1000):
+    s.add('a', 'load', 'cache', 'numpy', 0.001)
+  s.add('a', 'load', 'file', 'numpy', 0.5, 100)
+  s.add('a', 'load', 'file', 'numpy', 0.5, 100)
+  assert len(s.totals) == 2
+  total = s.totals[('a', 'load', 'file')]
+  assert total.count == 2 and total.seconds == 1.0 and total.size == 200
+  assert s.bytes_read() == 200
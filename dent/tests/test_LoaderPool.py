@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+from concurrent.futures import CancelledError
+from dent import messaging
+from dent import taskQueue
+from dent.LoaderPool import LoaderPool
+
+def blocked(pool):
+  """Occupies the pool's only worker until the returned event is set."""
+  release = threading.Event()
+  started = threading.Event()
+  def block():
+    started.set()
+    release.wait()
+  pool.submit(block)
+  started.wait()
+  return release
+
+def test_result():
+  pool = LoaderPool(2)
+  assert pool.submit(sum, ([1, 2, 3],)).result(timeout=5) == 6
+
+def test_higher_priority_first():
+  pool = LoaderPool(1)
+  release = blocked(pool)
+  order = []
+  futures = [pool.submit(order.append, (p,), priority=p) for p in (1, 3, 2)]
+  release.set()
+  for future in futures:
+    future.result(timeout=5)
+  assert order == [3, 2, 1]
+
+def test_cancel_pending():
+  pool = LoaderPool(1)
+  release = blocked(pool)
+  ran = []
+  future = pool.submit(ran.append, (1,))
+  assert future.cancel()
+  release.set()
+  pool.submit(lambda: None).result(timeout=5)
+  assert ran == []
+  with pytest.raises(CancelledError):
+    future.result()
+
+def test_exception_propagates():
+  pool = LoaderPool(1)
+  with pytest.raises(ZeroDivisionError):
+    pool.submit(lambda: 1 / 0).result(timeout=5)
+
+def test_callback_runs_on_main_thread_queue(monkeypatch):
+  monkeypatch.setattr(taskQueue, 'mainThreadQueue', taskQueue.deque())
+  pool = LoaderPool(1)
+  results = []
+  pool.submit(lambda: 42, callback=results.append).result(timeout=5)
+  assert results == []
+  deadline = time.time() + 5
+  while not taskQueue.mainThreadQueue and time.time() < deadline:
+    time.sleep(0.01)
+  task = taskQueue.mainThreadQueue.popleft()
+  task.func(*task.args)
+  assert results == [42]
+
+def test_progress_messages(monkeypatch):
+  monkeypatch.setattr(messaging, 'events', messaging.deque())
+  pool = LoaderPool(1)
+  release = blocked(pool)
+  ok = pool.submit(lambda: None, name='rock')
+  failed = pool.submit(lambda: 1 / 0, name='tree')
+  release.set()
+  for future in (ok, failed):
+    try:
+      future.result(timeout=5)
+    except ZeroDivisionError:
+      pass
+  deadline = time.time() + 5
+  while len(messaging.events) < 5 and time.time() < deadline:
+    time.sleep(0.01)
+  received = [(message.type, message.data) for message in messaging.events]
+  assert received == [
+      ('loading_progress', (1, 3)),
+      ('loaded', ('rock',)), ('loading_progress', (2, 3)),
+      ('load_failed', ('tree',)), ('loading_progress', (3, 3))]
+  assert pool.submitted == pool.finished == 0
+
+def test_load_before_game_start(monkeypatch):
+  for name in ('messages', 'events'):
+    monkeypatch.setattr(messaging, name, messaging.deque())
+  monkeypatch.setattr(messaging, 'handled_messages', [])
+  monkeypatch.setattr(messaging, 'handlers', {})
+  monkeypatch.setattr(messaging, 'time_zero', 0)
+  messaging.add_handler('game_start', messaging.game_start_handler)
+  loaded = []
+  messaging.add_handler('loaded', loaded.append)
+  pool = LoaderPool(1)
+  pool.submit(lambda: None, name='rock').result(timeout=5)
+  deadline = time.time() + 5
+  while len(messaging.events) < 2 and time.time() < deadline:
+    time.sleep(0.01)
+  messaging.add_message(messaging.Message('game_start', (time.time(),)))
+  # As checked by messaging.load_replay
+  assert len(messaging.messages) == 1
+  messaging.process_messages()
+  assert [message.type for message in messaging.handled_messages] == ['game_start']
+  assert loaded == ['rock']
@@ -0,0 +1,193 @@
+import io
+import tarfile
+import numpy as np
+import dent.assets
+from dent.Mesh import Mesh
+
+def make_mesh(vertices=10):
+  mesh = Mesh('test-mesh', np.eye(4), np.zeros(3), 'models')
+  mesh.data = np.zeros(
+      vertices,
+      dtype=[('position', np.float32, 3), ('textcoord', np.float32, 2)])
+  mesh.data['position'] = np.arange(vertices * 3).reshape((-1, 3))
+  mesh.data['textcoord'] = 0.5
+  mesh.indices = np.arange(vertices - vertices % 3, dtype=np.uint32)
+  mesh.material_name = 'stone'
+  return mesh
+
+def assert_same_mesh(a, b):
+  assert a.name == b.name
+  assert a.directory == b.directory
+  assert a.material_name == b.material_name
+  assert a.data.dtype == b.data.dtype
+  assert np.all(a.data == b.data)
+  assert np.all(a.indices == b.indices)
+
+def test_binary_round_trip():
+  mesh = make_mesh()
+  f = io.BytesIO()
+  mesh._dent_asset_save_binary(f)
+  buffer = np.frombuffer(f.getvalue(), dtype=np.uint8)
+  assert_same_mesh(mesh, Mesh._dent_asset_load_binary(buffer))
+
+def test_binary_blocks_aligned():
+  f = io.BytesIO()
+  make_mesh(7)._dent_asset_save_binary(f)
+  buffer = np.frombuffer(f.getvalue(), dtype=np.uint8)
+  loaded = Mesh._dent_asset_load_binary(buffer)
+  start = buffer.__array_interface__['data'][0]
+  assert (loaded.data.__array_interface__['data'][0] - start) % 64 == 0
+  assert (loaded.indices.__array_interface__['data'][0] - start) % 64 == 0
+
+def test_binary_rejects_other_versions():
+  f = io.BytesIO()
+  make_mesh()._dent_asset_save_binary(f)
+  data = bytearray(f.getvalue())
+  data[8] = 99
+  try:
+    Mesh._dent_asset_load_binary(np.frombuffer(bytes(data), dtype=np.uint8))
+    assert False
+  except IOError:
+    pass
+
+def test_asset_file_is_memory_mapped(tmpdir):
+  mesh = make_mesh()
+  filename = str(tmpdir.join('mesh'))
+  dent.assets.saveToFile(mesh, filename, 'test-mesh')
+  with open(filename, 'rb') as f:
+    assert f.read(len(Mesh._dent_asset_magic)) == Mesh._dent_asset_magic
+  loaded = dent.assets.loadFromFile(filename, Mesh)
+  assert_same_mesh(mesh, loaded)
+  assert isinstance(loaded.data.base, np.memmap)
+
+def test_tar_fallback(tmpdir):
+  mesh = make_mesh()
+  filename = str(tmpdir.join('mesh'))
+  datastore = tarfile.open(filename, 'w')
+  mesh._dent_asset_save(datastore)
+  datastore.close()
+  assert_same_mesh(mesh, dent.assets.loadFromFile(filename, Mesh))
+
+def fake_assimp_mesh(vertices=100, seed=0):
+  """A stand in for a pyassimp mesh, with random vertex data."""
+  from types import SimpleNamespace
+  random = np.random.RandomState(seed)
+  return SimpleNamespace(
+      vertices=random.rand(vertices, 3).astype(np.float32),
+      normals=random.rand(vertices, 3).astype(np.float32),
+      tangents=random.rand(vertices, 3).astype(np.float32),
+      bitangents=random.rand(vertices, 3).astype(np.float32),
+      texturecoords=[random.rand(vertices, 3).astype(np.float32)],
+      faces=random.randint(0, vertices, (vertices, 3)).astype(np.uint32),
+      bones=[],
+      material=SimpleNamespace(properties={('name', 0): 'stone'}))
+
+def test_load_from_assimp_transforms():
+  transform = np.array([[0., -2., 0., 1.],
+                        [1., 0., 0., 2.],
+                        [0., 0., 3., 3.],
+                        [0., 0., 0., 1.]])
+  offset = np.array([0.5, 0.5, 0.5])
+  assimp_mesh = fake_assimp_mesh()
+  mesh = Mesh('test-mesh', transform, offset)
+  mesh.load_from_assimp(assimp_mesh, '', None, None)
+  tinvtrans = np.linalg.inv(transform).T
+  for i in range(len(assimp_mesh.vertices)):
+    position = transform.dot(np.append(assimp_mesh.vertices[i], 1))[:3] - offset
+    normal = tinvtrans.dot(np.append(assimp_mesh.normals[i], 0))[:3]
+    assert np.allclose(mesh.data['position'][i], position, atol=1e-5)
+    assert np.allclose(mesh.data['normal'][i], normal, atol=1e-5)
+  assert np.allclose(mesh.data['textcoord'][:, 1], 1 - assimp_mesh.texturecoords[0][:, 1])
+  assert mesh.material_name == 'stone'
+  assert np.all(mesh.indices == assimp_mesh.faces.reshape(-1))
+
+def test_pack_bone_weights_keeps_heaviest_four():
+  from dent.Mesh import pack_bone_weights
+  vertex_ids = [0, 0, 0, 0, 0, 1, 2, 2]
+  bone_ids   = [1, 2, 3, 4, 5, 7, 8, 9]
+  weights    = [.1, .5, .2, .1, .1, .4, .3, .1]
+  packed_ids, packed_weights = pack_bone_weights(4, vertex_ids, bone_ids, weights)
+  assert packed_ids[0, 0] == 2 and packed_ids[0, 1] == 3
+  assert np.allclose(packed_weights[0], np.array([.5, .2, .1, .1]) / .9)
+  assert list(packed_ids[1]) == [7, 59, 59, 59]
+  assert np.allclose(packed_weights[1], [1, 0, 0, 0])
+  assert list(packed_ids[2]) == [8, 9, 59, 59]
+  assert np.allclose(packed_weights[2], [.75, .25, 0, 0])
+  assert list(packed_ids[3]) == [59] * 4
+  assert np.all(packed_weights[3] == 0)
+
+def test_load_from_assimp_bones():
+  from types import SimpleNamespace
+  def node(name, *children):
+    return SimpleNamespace(name=name, children=list(children))
+  scene = SimpleNamespace(rootnode=node('root', node('hip', node('knee'))))
+  def bone(name, weights):
+    return SimpleNamespace(
+        name=name, offsetmatrix=np.eye(4),
+        weights=[SimpleNamespace(vertexid=v, weight=w) for v, w in weights])
+  assimp_mesh = fake_assimp_mesh(3)
+  assimp_mesh.bones = [bone('hip', [(0, 1.), (1, .5)]), bone('knee', [(1, .5), (2, 1.)])]
+  parent = SimpleNamespace(bones={'root': (0, '', np.eye(4))})
+  mesh = Mesh('test-mesh')
+  mesh.load_from_assimp(assimp_mesh, '', scene, parent)
+  assert parent.bones['hip'][:2] == (1, 'root')
+  assert parent.bones['knee'][:2] == (2, 'hip')
+  assert mesh.data['bone_ids'][0][0] == 1
+  assert set(mesh.data['bone_ids'][1][:2]) == {1, 2}
+  assert np.allclose(mesh.data['weights'][1], [.5, .5, 0, 0])
+  assert mesh.data['bone_ids'][2][0] == 2
+
+def test_merge_meshes():
+  from dent.Mesh import merge_meshes
+  meshes = [make_mesh(6), make_mesh(9), make_mesh(3)]
+  merged = merge_meshes(meshes, 'batch')
+  assert merged.name == 'batch'
+  assert merged.material_name == 'stone'
+  assert len(merged.data) == 18
+  assert list(merged.indices[6:9]) == [6, 7, 8]
+  assert list(merged.indices[-3:]) == [15, 16, 17]
+  for i, mesh in enumerate(meshes):
+    start = sum(len(m.data) for m in meshes[:i])
+    assert np.all(merged.data[start:start + len(mesh.data)] == mesh.data)
+  meshes[1].material_name = 'wood'
+  assert merge_meshes(meshes, 'batch').material_name is None
+
+def test_indices_narrowed():
+  from dent.Mesh import narrow_indices, merge_meshes
+  assert narrow_indices(np.arange(6, dtype=np.int64), 65536).dtype == np.uint16
+  assert narrow_indices(np.arange(6), 65537).dtype == np.uint32
+  mesh = Mesh('test-mesh')
+  mesh.load_from_assimp(fake_assimp_mesh(), '', None, None)
+  assert mesh.indices.dtype == np.uint16
+  big = make_mesh(40000)
+  big.indices = narrow_indices(big.indices, len(big.data))
+  merged = merge_meshes([big, big], 'batch')
+  assert merged.indices.dtype == np.uint32
+  assert merged.indices[-1] == int(big.indices[-1]) + len(big.data)
+
+def test_bounds_saved_with_mesh():
+  mesh = make_mesh()
+  mesh.compute_bounds()
+  assert np.all(mesh.bounds == [[0, 1, 2], [27, 28, 29]])
+  centre, radius = mesh.bounding_sphere
+  assert np.allclose(centre, [13.5, 14.5, 15.5])
+  assert np.all(np.linalg.norm(mesh.data['position'] - centre, axis=1) <= radius)
+  f = io.BytesIO()
+  mesh._dent_asset_save_binary(f)
+  loaded = Mesh._dent_asset_load_binary(np.frombuffer(f.getvalue(), np.uint8))
+  assert np.all(loaded.bounds == mesh.bounds)
+  assert loaded.bounding_sphere[1] == radius
+  metadata = mesh._dent_asset_metadata()
+  assert metadata['bounds'] == mesh.bounds.tolist()
+  assert metadata['bounding_sphere'] == centre.tolist() + [radius]
+
+def test_bounds_computed_for_older_assets(tmpdir):
+  mesh = make_mesh()
+  filename = str(tmpdir.join('mesh'))
+  with tarfile.open(filename, 'w') as datastore:
+    mesh._dent_asset_save(datastore)
+  with tarfile.open(filename, 'r') as datastore:
+    loaded = Mesh._dent_asset_load(datastore)
+  assert np.all(loaded.bounds == [[0, 1, 2], [27, 28, 29]])
+  loaded._load_bounds_config({})
+  assert np.all(loaded.bounds == [[0, 1, 2], [27, 28, 29]])
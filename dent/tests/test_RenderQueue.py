@@ -0,0 +1,80 @@
+from dent.RenderQueue import RenderQueue, pack_key
+
+class FakeShader(object):
+  def __init__(self, name, log):
+    self.name = name
+    self.log = log
+    self.uniforms = {}
+
+  def load(self):
+    self.log.append(('load', self.name))
+
+  def __setitem__(self, name, value):
+    self.uniforms[name] = value
+
+  def draw(self, mode, render_id):
+    self.log.append(('draw', self.name, render_id, self.uniforms.get('model')))
+
+class FakeMaterial(object):
+  def __init__(self, name, log):
+    self.name = name
+    self.log = log
+
+  def set_uniforms(self, shader):
+    self.log.append(('material', self.name))
+
+def test_pack_key_orders_fields():
+  assert pack_key(1, 0, 0, 0, 0) > pack_key(0, 4095, 65535, 65535, 65535)
+  assert pack_key(0, 2, 0, 0, 0) > pack_key(0, 1, 65535, 65535, 65535)
+  assert pack_key(0, 1, 1, 3, 0) > pack_key(0, 1, 1, 2, 100)
+  assert pack_key(0, 1, 1, 2, 101) > pack_key(0, 1, 1, 2, 100)
+
+def test_draws_grouped_by_state():
+  log = []
+  shaders = [FakeShader('a', log), FakeShader('b', log)]
+  materials = [FakeMaterial('stone', log), FakeMaterial('wood', log)]
+  queue = RenderQueue()
+  for i in range(4):
+    queue.add(shaders[i % 2], materials[i // 2], i, 4, {'model': i})
+  queue.add(shaders[0], materials[0], 4, 4, {'model': 4})
+  queue.submit()
+  assert log == [
+      ('load', 'a'), ('material', 'stone'), ('draw', 'a', 0, 0),
+      ('draw', 'a', 4, 4), ('material', 'wood'), ('draw', 'a', 2, 2),
+      ('load', 'b'), ('material', 'stone'), ('draw', 'b', 1, 1),
+      ('material', 'wood'), ('draw', 'b', 3, 3)]
+  assert queue.stats['draws'] == 5
+  assert queue.stats['shader_changes'] == 2
+  assert queue.stats['shader_changes_saved'] == 3
+  assert queue.stats['material_changes'] == 4
+  assert queue.stats['material_changes_saved'] == 1
+  assert len(queue) == 0
+
+def test_draws_front_to_back_within_material():
+  log = []
+  shader = FakeShader('a', log)
+  material = FakeMaterial('stone', log)
+  queue = RenderQueue(far=100.)
+  queue.add(shader, material, 0, 4, {'model': 'far'}, depth=50.)
+  queue.add(shader, material, 0, 4, {'model': 'near'}, depth=5.)
+  queue.add(shader, material, 0, 4, {'model': 'beyond'}, depth=500.)
+  queue.add(shader, material, 1, 4, {'model': 'nearest'}, depth=1.)
+  queue.submit()
+  assert [entry[3] for entry in log if entry[0] == 'draw'] == [
+      'nearest', 'near', 'far', 'beyond']
+
+def test_ids_released_with_queue():
+  log = []
+  queue = RenderQueue()
+  queue.add(FakeShader('a', log), FakeMaterial('stone', log), 0, 4)
+  queue.submit()
+  assert queue._ids == {}
+
+def test_stages_drawn_in_order():
+  log = []
+  shader = FakeShader('a', log)
+  queue = RenderQueue()
+  queue.add(shader, None, 0, 4, {'model': 'late'}, stage=1)
+  queue.add(shader, None, 1, 4, {'model': 'early'}, stage=0)
+  queue.submit()
+  assert [entry[3] for entry in log if entry[0] == 'draw'] == ['early', 'late']
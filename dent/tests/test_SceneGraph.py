@@ -0,0 +1,121 @@
+import weakref
+import numpy as np
+import pytest
+from dent import transforms
+from dent.SceneGraph import SceneGraph, world_matrices
+
+def translation(x, y, z):
+  matrix = np.eye(4, dtype=np.float32)
+  transforms.translate(matrix, x, y, z)
+  return matrix
+
+def test_world_matrices_compose():
+  graph = SceneGraph()
+  root = graph.add_node(translation(1, 0, 0))
+  child = graph.add_node(translation(0, 2, 0), parent=root)
+  grandchild = graph.add_node(np.diag([2., 2., 2., 1.]), parent=child)
+  assert np.allclose(child.world[3, :3], [1, 2, 0])
+  assert np.allclose(np.array([1, 1, 1, 1]).dot(grandchild.world), [3, 4, 2, 1])
+
+def test_changes_propagate_to_descendants():
+  graph = SceneGraph()
+  root = graph.add_node()
+  child = graph.add_node(translation(0, 1, 0), parent=root)
+  other = graph.add_node(translation(5, 0, 0))
+  graph.update()
+  root.local = translation(0, 0, 3)
+  assert list(graph.dirty[:3]) == [True, False, False]
+  graph.update()
+  assert np.allclose(child.world[3, :3], [0, 1, 3])
+  assert np.allclose(other.world[3, :3], [5, 0, 0])
+  assert not graph.dirty.any()
+
+def test_only_changed_subtrees_updated():
+  graph = SceneGraph()
+  a = graph.add_node(translation(1, 0, 0))
+  b = graph.add_node(translation(2, 0, 0))
+  graph.update()
+  graph.world[b.index] = 0
+  a.local = translation(3, 0, 0)
+  graph.update()
+  assert np.allclose(a.world[3, :3], [3, 0, 0])
+  assert np.all(b.world == 0)
+
+def test_local_functions_called_once_per_change():
+  calls = []
+  def local():
+    calls.append(1)
+    return translation(len(calls), 0, 0)
+  graph = SceneGraph()
+  node = graph.add_node(local_function=local)
+  child = graph.add_node(parent=node)
+  assert np.allclose(child.world[3, :3], [1, 0, 0])
+  child.world
+  assert len(calls) == 1
+  node.invalidate()
+  node.invalidate()
+  assert np.allclose(child.world[3, :3], [2, 0, 0])
+  assert len(calls) == 2
+
+def test_reparenting():
+  graph = SceneGraph()
+  a = graph.add_node(translation(1, 0, 0))
+  b = graph.add_node(translation(0, 1, 0))
+  child = graph.add_node(parent=a)
+  assert np.allclose(child.world[3, :3], [1, 0, 0])
+  child.parent = b
+  assert np.allclose(child.world[3, :3], [0, 1, 0])
+  assert a.children == [] and b.children == [child]
+  child.parent = None
+  assert np.allclose(child.world[3, :3], [0, 0, 0])
+  with pytest.raises(ValueError):
+    a.parent = a
+
+def test_graph_grows():
+  graph = SceneGraph(capacity=2)
+  nodes = [graph.add_node(translation(1, 0, 0))]
+  for _ in range(99):
+    nodes.append(graph.add_node(translation(1, 0, 0), parent=nodes[-1]))
+  assert np.allclose(nodes[-1].world[3, :3], [100, 0, 0])
+  assert len(graph.levels()) == 100
+
+def test_removing_nodes():
+  graph = SceneGraph()
+  a = graph.add_node(translation(1, 0, 0))
+  b = graph.add_node(translation(0, 1, 0), parent=a)
+  c = graph.add_node(translation(0, 0, 1), parent=b)
+  graph.update()
+  graph.remove_node(b)
+  assert len(graph) == 2
+  assert a.children == [] and c.parent is None
+  assert np.allclose(c.world[3, :3], [0, 0, 1])
+  d = graph.add_node(parent=a)
+  assert d.index == b.index
+  assert np.allclose(d.world[3, :3], [1, 0, 0])
+  assert len(graph.levels()) == 2
+
+def test_bound_local_functions_held_weakly():
+  class Thing(object):
+    def local(self):
+      return translation(1, 0, 0)
+  thing = Thing()
+  graph = SceneGraph()
+  node = graph.add_node(local_function=thing.local)
+  child = graph.add_node(parent=node)
+  assert np.allclose(child.world[3, :3], [1, 0, 0])
+  reference = weakref.ref(thing)
+  del thing
+  assert reference() is None
+  node.invalidate()
+  assert np.allclose(child.world[3, :3], [1, 0, 0])
+
+def test_world_matrices_of_instances():
+  graph = SceneGraph()
+  node = graph.add_node(translation(0, 0, 5))
+  instances = np.array([translation(1, 0, 0), translation(2, 0, 0)])
+  assert world_matrices(instances, None) is instances
+  world = world_matrices(instances, node)
+  assert np.allclose(world[:, 3, :3], [[1, 0, 5], [2, 0, 5]])
+  node.local = translation(0, 3, 0)
+  world = world_matrices(instances, node)
+  assert np.allclose(world[:, 3, :3], [[1, 3, 0], [2, 3, 0]])
@@ -0,0 +1,60 @@
+import numpy as np
+from dent import transforms
+from dent.TransformStore import TransformStore
+
+def reference_matrix(position, direction, bidirection, angle, scale):
+  t = np.eye(4, dtype=np.float32)
+  t[2, 0:3] = direction
+  t[0, 0:3] = bidirection
+  t[0][0:3], t[2][0:3] = np.cos(angle) * t[0][0:3] + np.sin(angle) * t[2][0:3],\
+                         np.cos(angle) * t[2][0:3] - np.sin(angle) * t[0][0:3]
+  t[0:3, 0:3] *= scale
+  transforms.translate(t, position[0], position[1], position[2])
+  return t
+
+def test_matrices_match_objects():
+  rng = np.random.RandomState(0)
+  store = TransformStore(capacity=4)
+  handles = [store.add() for _ in range(100)]
+  transforms_ = []
+  for handle in handles:
+    transform = (rng.randn(3), rng.randn(3), rng.randn(3), rng.rand() * 6,
+                 rng.rand() + 0.5)
+    for name, value in zip(
+        ('position', 'direction', 'bidirection', 'angle', 'scale'), transform):
+      store.set(handle, name, value)
+    transforms_.append(transform)
+  for handle, transform in zip(handles, transforms_):
+    assert np.allclose(store.matrix(handle), reference_matrix(*transform),
+                       atol=1e-5)
+  assert not store.dirty.any()
+
+def test_defaults_and_updates():
+  store = TransformStore()
+  handle = store.add()
+  assert np.all(store.matrix(handle) == np.eye(4))
+  store.get(handle, 'position')[:] = (1, 2, 3)
+  assert np.all(store.matrix(handle)[3, :3] == 0)
+  store.mark_dirty(handle)
+  assert np.all(store.matrix(handle)[3, :3] == (1, 2, 3))
+
+def test_anchor_replaces_position():
+  store = TransformStore()
+  handle = store.add()
+  assert store.get(handle, 'last_unanimated_position') is None
+  store.set(handle, 'position', (1, 0, 0))
+  store.set(handle, 'last_unanimated_position', (5, 0, 0))
+  assert np.all(store.matrix(handle)[3, :3] == (5, 0, 0))
+  store.set(handle, 'last_unanimated_position', None)
+  assert np.all(store.matrix(handle)[3, :3] == (1, 0, 0))
+
+def test_handles_reused():
+  store = TransformStore()
+  a = store.add()
+  b = store.add()
+  store.set(a, 'scale', 3)
+  store.remove(a)
+  assert len(store) == 1
+  assert store.add() == a
+  assert store.get(a, 'scale') == 1
+  assert b != a
@@ -0,0 +1,329 @@
+import os
+import pytest
+import numpy as np
+import dent.assets
+
+@pytest.fixture(autouse=True)
+def asset_store(tmpdir, monkeypatch):
+  monkeypatch.chdir(tmpdir)
+  dent.assets.initialise()
+  dent.assets.invalidate()
+  yield
+  dent.assets.invalidate()
+
+class Counter(object):
+  def __init__(self, value):
+    self.value = value
+    self.calls = 0
+
+  def __call__(self):
+    self.calls += 1
+    return self.value
+
+def test_generated_once():
+  generate = Counter(np.arange(10))
+  a = dent.assets.getAsset('numbers', generate)
+  b = dent.assets.getAsset('numbers', generate)
+  assert generate.calls == 1
+  assert np.all(a == b)
+
+def test_repeated_loads_come_from_cache():
+  dent.assets.saveAsset('numbers', np.arange(10))
+  dent.assets.invalidate()
+  hits = dent.assets.cache.hits
+  a = dent.assets.getAsset('numbers')
+  b = dent.assets.getAsset('numbers')
+  assert a is b
+  assert dent.assets.cache.hits == hits + 1
+
+def test_invalidate_rereads_from_disk():
+  dent.assets.saveAsset('numbers', np.arange(10))
+  a = dent.assets.getAsset('numbers')
+  dent.assets.invalidate('numbers')
+  b = dent.assets.getAsset('numbers')
+  assert a is not b
+  assert np.all(a == b)
+
+def test_force_reload_replaces_cached_value():
+  dent.assets.getAsset('value', lambda: 1)
+  assert dent.assets.getAsset('value', lambda: 2, forceReload=True) == 2
+  assert dent.assets.getAsset('value') == 2
+
+def test_zero_budget_disables_cache():
+  dent.assets.set_cache_budget(0)
+  try:
+    dent.assets.saveAsset('numbers', np.arange(10))
+    assert dent.assets.getAsset('numbers') is not dent.assets.getAsset('numbers')
+  finally:
+    dent.assets.set_cache_budget(dent.assets.DEFAULT_CACHE_BUDGET)
+
+def test_metadata_from_index():
+  dent.assets.saveAsset('numbers', np.arange(10))
+  assetID = dent.assets.getInternalAssetID('numbers')
+  assert dent.assets.getAllAssetIds() == [assetID]
+  assert dent.assets.getAssetName(assetID) == 'numbers'
+  assert dent.assets.get_asset_type(assetID) == 'numpy'
+  metadata = dent.assets.get_asset_metadata(assetID)
+  assert metadata['size'] == os.path.getsize(dent.assets.get_filename(assetID))
+
+def test_assets_sharded():
+  dent.assets.saveAsset('numbers', np.arange(10))
+  assetID = dent.assets.getInternalAssetID('numbers')
+  assert os.path.exists(os.path.join('_assets', assetID[:2], assetID))
+
+def test_flat_store_migrated():
+  assetID = dent.assets.getInternalAssetID('value')
+  with open(os.path.join('_assets', assetID), 'wb') as f:
+    np.save(f, np.arange(3))
+  with open(os.path.join('_assets', assetID + '.meta'), 'w') as f:
+    f.write('value\nnumpy\n')
+  dent.assets.initialise()
+  assert dent.assets.getAssetName(assetID) == 'value'
+  assert not os.path.exists(os.path.join('_assets', assetID + '.meta'))
+  assert np.all(dent.assets.getAsset('value') == np.arange(3))
+
+def write_source(contents, mtime=None):
+  with open('model.obj', 'w') as f:
+    f.write(contents)
+  if mtime is not None:
+    os.utime('model.obj', (mtime, mtime))
+
+def test_unchanged_source_not_regenerated():
+  write_source('v 0 0 0')
+  generate = Counter(1)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  dent.assets.invalidate()
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  assert generate.calls == 1
+
+def test_absolute_and_relative_sources_match():
+  write_source('v 0 0 0')
+  generate = Counter(1)
+  dent.assets.getAsset('model', generate, sources=(os.path.abspath('model.obj'),))
+  dent.assets.invalidate()
+  dent.assets.getAsset('model', generate, sources=('./model.obj',))
+  assert generate.calls == 1
+
+def test_changed_source_regenerated():
+  write_source('v 0 0 0', 1000)
+  generate = Counter(1)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  write_source('v 0 0 1', 2000)
+  generate.value = 2
+  assert dent.assets.getAsset('model', generate, sources=('model.obj',)) == 2
+  assert generate.calls == 2
+
+def test_touched_source_not_regenerated():
+  write_source('v 0 0 0', 1000)
+  generate = Counter(1)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  write_source('v 0 0 0', 2000)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  assert generate.calls == 1
+  assetID = dent.assets.getInternalAssetID('model')
+  assert dent.assets.get_asset_metadata(assetID)['sources']['model.obj'][0] == 2000
+
+def test_deleted_source_regenerated():
+  write_source('v 0 0 0')
+  generate = Counter(1)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  os.remove('model.obj')
+  dent.assets.getAsset('model', generate)
+  assert generate.calls == 2
+
+def test_changed_generator_regenerated():
+  dent.assets.getAsset('value', Counter(1))
+  assert dent.assets.getAsset('value', lambda: 2) == 2
+
+def test_only_stale_asset_regenerated():
+  write_source('v 0 0 0', 1000)
+  other = Counter(1)
+  dent.assets.getAsset('other', other)
+  generate = Counter(1)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  write_source('v 0 0 1', 2000)
+  dent.assets.getAsset('model', generate, sources=('model.obj',))
+  dent.assets.getAsset('other', other)
+  assert generate.calls == 2
+  assert other.calls == 1
+
+def test_assets_read_from_pack():
+  dent.assets.saveAsset('numbers', np.arange(10))
+  dent.assets.saveAsset('value', {'a': 1})
+  dent.assets.build_pack(remove_loose=True)
+  assert not os.path.exists(dent.assets.get_filename(dent.assets.getInternalAssetID('numbers')))
+  dent.assets.initialise()
+  dent.assets.invalidate()
+  assert np.all(dent.assets.getAsset('numbers') == np.arange(10))
+  assert dent.assets.getAsset('value') == {'a': 1}
+  assert dent.assets.is_up_to_date('numbers')
+
+def test_pack_survives_lost_index():
+  dent.assets.saveAsset('value', {'a': 1})
+  dent.assets.build_pack('zlib')
+  os.remove(os.path.join('_assets', 'index.log'))
+  dent.assets.initialise()
+  dent.assets.invalidate()
+  assert dent.assets.getAsset('value') == {'a': 1}
+  assert dent.assets.getAssetName(dent.assets.getInternalAssetID('value')) == 'value'
+
+def test_newer_loose_asset_overrides_pack():
+  dent.assets.saveAsset('value', 1)
+  dent.assets.build_pack()
+  dent.assets.saveAsset('value', 2)
+  dent.assets.invalidate()
+  assert dent.assets.getAsset('value') == 2
+
+def test_get_asset_async():
+  generate = Counter({'a': 1})
+  future = dent.assets.getAssetAsync('value', generate)
+  assert future.result(timeout=5) == {'a': 1}
+  assert dent.assets.getAsset('value') == {'a': 1}
+  assert generate.calls == 1
+
+def test_store_limit_evicts_least_recently_used():
+  for name in ('a', 'b', 'c'):
+    dent.assets.saveAsset(name, np.zeros(1000, dtype=np.uint8))
+  dent.assets.getAsset('a')
+  size = dent.assets.get_asset_metadata(dent.assets.getInternalAssetID('a'))['size']
+  try:
+    dent.assets.set_store_limit(2 * size)
+    assert dent.assets.is_up_to_date('a')
+    assert not dent.assets.is_up_to_date('b')
+    assert dent.assets.is_up_to_date('c')
+  finally:
+    dent.assets.set_store_limit(None)
+
+def test_store_limit_ignores_packed_assets():
+  dent.assets.saveAsset('packed', np.zeros(1000, dtype=np.uint8))
+  dent.assets.build_pack(remove_loose=True)
+  dent.assets.saveAsset('loose', np.zeros(1000, dtype=np.uint8))
+  size = dent.assets.get_asset_metadata(dent.assets.getInternalAssetID('loose'))['size']
+  try:
+    assert dent.assets.set_store_limit(size) == 0
+    assert dent.assets.is_up_to_date('loose')
+    assert dent.assets.is_up_to_date('packed')
+  finally:
+    dent.assets.set_store_limit(None)
+
+def test_access_times_flushed_to_index():
+  dent.assets.saveAsset('value', 1)
+  dent.assets.getAsset('value')
+  dent.assets.flush_access_times()
+  record = dent.assets.get_asset_metadata(dent.assets.getInternalAssetID('value'))
+  assert record['accessed'] >= record['saved']
+
+def test_garbage_collection_drops_assets_of_removed_sources():
+  with open('model.obj', 'w') as f:
+    f.write('v 0 0 0\n')
+  dent.assets.saveAsset('model-mesh', np.arange(100), sources=('model.obj',))
+  dent.assets.saveAsset('unrelated', 1)
+  os.remove('model.obj')
+  assert dent.assets.collect_garbage() > 0
+  assert not dent.assets.is_up_to_date('model-mesh')
+  assert dent.assets.is_up_to_date('unrelated')
+
+def test_garbage_collection_drops_unreferenced_owned_assets():
+  dent.assets.saveAsset('mesh-0', np.arange(10))
+  dent.assets.saveAsset('mesh-1', np.arange(10))
+  dent.assets.saveAsset('mesh_info', ['mesh-0', 'mesh-1'])
+  dent.assets.set_references('mesh_info', ['mesh-0', 'mesh-1'])
+  dent.assets.collect_garbage()
+  assert dent.assets.is_up_to_date('mesh-1')
+  dent.assets.saveAsset('mesh_info', ['mesh-0'])
+  dent.assets.set_references('mesh_info', ['mesh-0'])
+  dent.assets.saveAsset('mesh-0', np.arange(10))
+  dent.assets.collect_garbage()
+  assert dent.assets.is_up_to_date('mesh-0')
+  assert not dent.assets.is_up_to_date('mesh-1')
+
+def test_concurrent_requests_generate_once():
+  import threading
+  import time
+  def generate():
+    generate.calls += 1
+    time.sleep(0.05)
+    return np.arange(10)
+  generate.calls = 0
+  results = []
+  threads = [
+    threading.Thread(target=lambda: results.append(dent.assets.getAsset('shared', generate)))
+    for _ in range(4)
+  ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert generate.calls == 1
+  assert len(results) == 4
+
+def test_save_leaves_no_temporary_files():
+  dent.assets.saveAsset('value', {'a': 1})
+  filename = dent.assets.get_filename(dent.assets.getInternalAssetID('value'))
+  assert os.listdir(os.path.dirname(filename)) == [os.path.basename(filename)]
+
+def test_failed_save_keeps_previous_asset():
+  class Unpicklable(object):
+    def __reduce__(self):
+      raise TypeError('cannot pickle')
+  dent.assets.saveAsset('value', {'a': 1})
+  with pytest.raises(TypeError):
+    dent.assets.saveAsset('value', Unpicklable())
+  dent.assets.invalidate()
+  assert dent.assets.getAsset('value') == {'a': 1}
+
+def test_loads_are_recorded():
+  dent.assets.stats.reset()
+  dent.assets.getAsset('numbers', lambda: np.arange(10))
+  dent.assets.getAsset('numbers')
+  dent.assets.invalidate()
+  dent.assets.getAsset('numbers')
+  dent.assets.saveAsset('value', {'a': 1})
+  origins = [
+    (t.name, t.action, t.origin, t.type, t.count)
+    for t in dent.assets.stats.totals.values()
+  ]
+  assert origins == [
+    ('numbers', 'load', 'generator', 'numpy', 1),
+    ('numbers', 'save', 'generator', 'numpy', 1),
+    ('numbers', 'load', 'cache', 'numpy', 1),
+    ('numbers', 'load', 'file', 'numpy', 1),
+    ('value', 'save', 'explicit', 'pickle', 1),
+  ]
+  assert dent.assets.stats.bytes_read() > 0
+  assert 'numbers' in dent.assets.report()
+
+def test_garbage_collection_keeps_packed_assets():
+  dent.assets.saveAsset('mesh-0', np.arange(10))
+  dent.assets.saveAsset('mesh_info', ['mesh-0'])
+  dent.assets.set_references('mesh_info', ['mesh-0'])
+  dent.assets.build_pack(remove_loose=True)
+  # A loose asset owned by a packed one
+  dent.assets.saveAsset('mesh-0', np.arange(20))
+  packed = dent.assets.getInternalAssetID('mesh_info')
+  assert dent.assets.collect_garbage() == 0
+  assert packed in dent.assets.get_index()
+  assert dent.assets.is_up_to_date('mesh_info')
+  assert os.path.exists(
+      dent.assets.get_filename(dent.assets.getInternalAssetID('mesh-0')))
+
+def test_empty_asset_file_regenerated():
+  dent.assets.saveAsset('value', {'a': 1})
+  open(dent.assets.get_filename(dent.assets.getInternalAssetID('value')), 'w').close()
+  dent.assets.invalidate()
+  generate = Counter({'a': 2})
+  assert dent.assets.getAsset('value', generate) == {'a': 2}
+  assert generate.calls == 1
+
+def test_truncated_mesh_regenerated():
+  from dent.Mesh import Mesh
+  from dent.tests.test_Mesh import make_mesh
+  dent.assets.getAsset('mesh', lambda: make_mesh(300), type_hint=Mesh)
+  filename = dent.assets.get_filename(dent.assets.getInternalAssetID('mesh'))
+  with open(filename, 'r+b') as f:
+    f.truncate(os.path.getsize(filename) // 2)
+  dent.assets.invalidate()
+  generate = Counter(make_mesh(300))
+  mesh = dent.assets.getAsset('mesh', generate, type_hint=Mesh)
+  assert generate.calls == 1
+  assert len(mesh.data) == 300
@@ -0,0 +1,56 @@
+import numpy as np
+from dent import culling
+from dent import transforms
+
+def perspective_frustum(position=(0, 0, 0)):
+  view = np.eye(4, dtype=np.float32)
+  transforms.translate(view, *-np.array(position, dtype=np.float32))
+  return culling.Frustum.from_view_projection(
+      view, transforms.perspective(90, 1, 1, 100))
+
+def test_spheres_in_perspective_frustum():
+  frustum = perspective_frustum()
+  centres = [(0, 0, -10), (0, 0, 10), (0, 0, -200), (0, 0, -101), (20, 0, -10),
+             (10.5, 0, -10), (0, 0, 0)]
+  radii = [1, 1, 1, 2, 1, 1, 0.5]
+  assert list(frustum.test_spheres(centres, radii)) == [
+      True, False, False, True, False, True, False]
+
+def test_frustum_follows_view():
+  frustum = perspective_frustum((100, 0, 0))
+  assert frustum.test_sphere((100, 0, -10), 1)
+  assert not frustum.test_sphere((0, 0, -10), 1)
+
+def test_orthographic_frustum():
+  frustum = culling.Frustum(transforms.ortho(-5, 5, -5, 5, 1, 10))
+  assert frustum.test_sphere((4, 4, -5), 0.5)
+  assert not frustum.test_sphere((6, 0, -5), 0.5)
+  assert not frustum.test_sphere((0, 0, -12), 1)
+
+def test_transform_spheres():
+  model = np.eye(4)
+  model[:3, :3] *= [1, 3, 2]
+  model[3, :3] = [10, 0, 0]
+  centres, radii = culling.transform_spheres([(1, 1, 1), (0, 0, 0)], [1, 2], model)
+  assert np.allclose(centres, [(11, 3, 2), (10, 0, 0)])
+  assert np.allclose(radii, [3, 6])
+
+def test_cull_counts():
+  culling.stats.reset()
+  frustum = perspective_frustum()
+  frustum.name = 'test'
+  kept = frustum.cull(['a', 'b', 'c'], [(0, 0, -5), (0, 0, 5), (1, 1, -5)],
+                      [1, 1, 1])
+  assert kept == ['a', 'c']
+  assert culling.stats.visible('test') == 2
+  assert culling.stats.culled('test') == 1
+  assert culling.stats.culled() == 1
+
+def test_reset_one_pass():
+  culling.stats.reset()
+  culling.stats.add('main', 3, 1)
+  culling.stats.add('shadow1', 2, 2)
+  culling.stats.reset('main')
+  culling.stats.add('main', 1, 0)
+  assert culling.stats.visible('main') == 1
+  assert culling.stats.culled() == 2
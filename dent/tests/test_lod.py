@@ -0,0 +1,57 @@
+import numpy as np
+from dent import lod
+from dent.Mesh import Mesh
+
+def sphere(rings=64, segments=64):
+  theta = np.linspace(0, np.pi, rings)
+  phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+  theta, phi = np.meshgrid(theta, phi, indexing='ij')
+  mesh = Mesh('sphere')
+  mesh.data = np.zeros(rings * segments, dtype=[('position', np.float32, 3),
+                                                ('textcoord', np.float32, 2)])
+  mesh.data['position'] = np.stack([np.sin(theta) * np.cos(phi),
+                                    np.cos(theta),
+                                    np.sin(theta) * np.sin(phi)], axis=-1).reshape((-1, 3))
+  triangles = []
+  for i in range(rings - 1):
+    for j in range(segments):
+      a, b = i * segments + j, i * segments + (j + 1) % segments
+      triangles += [(a, a + segments, b), (b, a + segments, b + segments)]
+  mesh.indices = np.array(triangles, dtype=np.uint32).reshape(-1)
+  mesh.material_name = 'stone'
+  return mesh
+
+def test_simplify_reduces_and_keeps_shape():
+  mesh = sphere()
+  previous = len(mesh.indices)
+  for level in (1, 2, 3):
+    simplified = lod.simplify(mesh, lod.resolution(mesh, level), 'sphere-lod1')
+    assert len(simplified.indices) < previous
+    previous = len(simplified.indices)
+    radii = np.linalg.norm(simplified.data['position'], axis=1)
+    assert np.all(np.abs(radii - 1) < 0.15)
+    assert simplified.indices.max() < len(simplified.data)
+  assert simplified.name == 'sphere-lod1'
+  assert simplified.material_name == 'stone'
+  assert simplified.indices.dtype == np.uint16
+  assert len(simplified.indices) < len(mesh.indices) / 8
+
+def test_simplified_triangles_not_degenerate():
+  triangles = lod.simplify(sphere(), 8).indices.reshape((-1, 3))
+  assert np.all(triangles[:, 0] != triangles[:, 1])
+  assert np.all(triangles[:, 1] != triangles[:, 2])
+  assert np.all(triangles[:, 2] != triangles[:, 0])
+
+def test_angular_size():
+  assert lod.angular_size((0, 0, 10), 1, (0, 0, 0)) == 0.1
+  assert lod.angular_size((0, 0, 0), 1, (0, 0, 0.5)) == np.inf
+
+def test_select_lod_with_hysteresis():
+  thresholds = (0.2, 0.1)
+  assert lod.select_lod(1.0, 0, thresholds) == 0
+  assert lod.select_lod(0.19, 0, thresholds) == 0
+  assert lod.select_lod(0.17, 0, thresholds) == 1
+  assert lod.select_lod(0.21, 1, thresholds) == 1
+  assert lod.select_lod(0.23, 1, thresholds) == 0
+  assert lod.select_lod(0.01, 0, thresholds) == 2
+  assert lod.select_lod(1.0, 2, thresholds) == 0
@@ -0,0 +1,54 @@
+import numpy as np
+from dent import meshopt
+from dent.Mesh import Mesh
+
+def grid(size):
+  """A square grid of vertices, as a triangle list in a cache hostile order."""
+  triangles = []
+  for i in range(size - 1):
+    for j in range(size - 1):
+      v = i * size + j
+      triangles.append((v, v + 1, v + size))
+      triangles.append((v + 1, v + size + 1, v + size))
+  triangles = np.array(triangles, dtype=np.uint32)
+  return triangles[np.random.RandomState(0).permutation(len(triangles))].reshape(-1)
+
+def triangle_set(indices, positions=None):
+  triangles = np.asarray(indices).reshape((-1, 3))
+  if positions is not None:
+    triangles = positions[triangles].reshape((-1, 3 * positions.shape[1]))
+  # Rotate each triangle to a canonical start, keeping its winding
+  return sorted(
+      min(tuple(t[i:]) + tuple(t[:i]) for i in range(0, len(t), len(t) // 3))
+      for t in map(tuple, triangles.tolist()))
+
+def test_acmr_bounds():
+  assert meshopt.acmr(np.array([0, 1, 2])) == 3
+  assert meshopt.acmr(np.array([0, 1, 2, 0, 1, 2])) == 1.5
+
+def test_tipsify_keeps_triangles_and_improves_acmr():
+  indices = grid(30)
+  optimised = meshopt.tipsify(indices, 900)
+  assert triangle_set(optimised) == triangle_set(indices)
+  assert meshopt.acmr(optimised) < 0.8 < meshopt.acmr(indices)
+
+def test_vertex_fetch_order():
+  data = np.arange(5, dtype=np.float32) * 10
+  data, indices = meshopt.optimise_vertex_fetch(data, np.array([3, 1, 4, 4, 1, 3]))
+  assert list(indices) == [0, 1, 2, 2, 1, 0]
+  assert list(data) == [30, 10, 40]
+
+def test_optimise_mesh():
+  mesh = Mesh('grid')
+  mesh.data = np.zeros(100, dtype=[('position', np.float32, 3)])
+  mesh.data['position'] = np.random.RandomState(1).rand(100, 3)
+  mesh.indices = grid(10)
+  mesh.material_name = 'stone'
+  optimised = meshopt.optimise(mesh)
+  assert optimised.material_name == 'stone'
+  assert optimised.indices.dtype == np.uint16
+  assert (triangle_set(optimised.indices, optimised.data['position']) ==
+          triangle_set(mesh.indices, mesh.data['position']))
+  assert meshopt.acmr(optimised.indices) < meshopt.acmr(mesh.indices)
+  assert optimised.name == 'grid'
+  assert meshopt.optimise(mesh, name='grid-optimised').name == 'grid-optimised'
@@ -0,0 +1,89 @@
+import io
+import numpy as np
+import pytest
+from dent import vertexformat
+from dent.Mesh import Mesh
+
+def full_mesh(vertices=50):
+  random = np.random.RandomState(0)
+  mesh = Mesh('mesh', np.eye(4), np.zeros(3))
+  mesh.data = np.zeros(vertices, dtype=[
+      ('position', np.float32, 3),
+      ('normal', np.float32, 3),
+      ('textcoord', np.float32, 2),
+      ('tangent', np.float32, 3),
+      ('bitangent', np.float32, 3),
+      ('bone_ids', np.int32, 4),
+      ('weights', np.float32, 4)])
+  mesh.data['position'] = random.rand(vertices, 3) * 10 - 5
+  for name in ('normal', 'tangent', 'bitangent'):
+    vectors = random.randn(vertices, 3)
+    mesh.data[name] = vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+  mesh.data['textcoord'] = random.rand(vertices, 2)
+  mesh.data['bone_ids'] = random.randint(0, 60, (vertices, 4))
+  weights = random.rand(vertices, 4)
+  mesh.data['weights'] = weights / weights.sum(axis=1)[:, np.newaxis]
+  mesh.indices = np.arange(vertices - vertices % 3, dtype=np.uint32)
+  mesh.material_name = 'stone'
+  return mesh
+
+def test_octahedral_round_trip():
+  vectors = np.random.RandomState(1).randn(1000, 3)
+  vectors /= np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+  vectors[:6] = [[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]]
+  decoded = vertexformat.octahedral_decode(vertexformat.octahedral_encode(vectors))
+  assert np.max(np.linalg.norm(decoded - vectors, axis=1)) < 1e-3
+
+def test_compact_layout_size():
+  mesh = full_mesh()
+  assert mesh.data.dtype.itemsize == 88
+  assert vertexformat.compact_mesh(mesh).data.dtype.itemsize == 32
+  assert vertexformat.compact_mesh(mesh, 'snorm16').data.dtype.itemsize == 32
+
+@pytest.mark.parametrize('position_format', ['float16', 'snorm16'])
+def test_compact_values(position_format):
+  mesh = full_mesh()
+  compact = vertexformat.compact_mesh(mesh, position_format)
+  assert np.allclose(compact.positions(), mesh.data['position'], atol=5e-3)
+  normals = vertexformat.octahedral_decode(compact.data['normal_oct'])
+  assert np.allclose(normals, mesh.data['normal'], atol=1e-3)
+  assert np.allclose(compact.data['textcoord'], mesh.data['textcoord'], atol=1e-3)
+  assert np.all(compact.data['bone_ids'] == mesh.data['bone_ids'])
+  assert np.allclose(compact.data['weights'] / 255, mesh.data['weights'], atol=1 / 255)
+  assert compact.material_name == 'stone'
+
+def test_quantized_mesh_saved():
+  compact = vertexformat.compact_mesh(full_mesh(), 'snorm16')
+  f = io.BytesIO()
+  compact._dent_asset_save_binary(f)
+  loaded = Mesh._dent_asset_load_binary(np.frombuffer(f.getvalue(), dtype=np.uint8))
+  assert np.allclose(loaded.positions(), compact.positions())
+  assert np.allclose(loaded._dent_asset_metadata()['bounds'],
+                     compact._dent_asset_metadata()['bounds'])
+
+def test_bone_ids_must_fit():
+  mesh = full_mesh()
+  mesh.data['bone_ids'][0, 0] = 300
+  with pytest.raises(ValueError):
+    vertexformat.compact_mesh(mesh)
+
+def test_pack_fields():
+  data = full_mesh().data
+  packed = vertexformat.pack_fields(data, {'position', 'textcoord'})
+  assert packed.dtype.names == ('position', 'textcoord')
+  assert packed.dtype.itemsize == 20
+  assert packed.flags['C_CONTIGUOUS']
+  assert np.all(packed['textcoord'] == data['textcoord'])
+  assert vertexformat.pack_fields(data, set(data.dtype.names)) is data
+
+def test_convert_fields():
+  data = np.zeros(3, dtype=[('position', np.float64, 3), ('bone_ids', np.uint32, 4),
+                            ('textcoord', np.float16, 2)])
+  data['position'] = [[1, 2, 3]]
+  converted = vertexformat.convert_fields(data, {np.dtype(np.float16)})
+  assert converted.dtype['position'].base == np.float32
+  assert converted.dtype['bone_ids'].base == np.float32
+  assert converted.dtype['textcoord'].base == np.float16
+  assert np.all(converted['position'] == data['position'])
+  assert vertexformat.convert_fields(converted, {
+      np.dtype(np.float16), np.dtype(np.float32)}) is converted
@@ -0,0 +1,151 @@
+"""Compact vertex formats for meshes.
+
+The full vertex layout made by :meth:`dent.Mesh.Mesh.load_from_assimp` (a position,
+normal, texture coordinate, tangent and bitangent, four bone IDs and four weights)
+stores 32 bit values for every attribute, which is 88 bytes a vertex.  The compact
+layout made here stores
+
+  * positions as half floats or as normalised 16 bit integers (padded to four
+    components, so that each attribute stays four byte aligned),
+  * normals, tangents and bitangents octahedral encoded into two normalised 16 bit
+    integers, in fields named ``normal_oct``, ``tangent_oct`` and ``bitangent_oct``,
+  * texture coordinates as half floats and
+  * bone IDs and weights as bytes (the weights normalised),
+
+which is 32 bytes a vertex for those same attributes.  Shaders read the octahedral
+fields as ``vec2`` and decode them with ``oct_decode`` from the ``vertexformat.shd``
+include, and read ``bone_ids`` as a ``uvec4``.  Normalised 16 bit positions lie in
+[-1, 1] and are mapped back with the mesh's ``position_scale`` and
+``position_offset``, which objects set as the ``positionScale`` and
+``positionOffset`` uniforms (see ``dequantize_position`` in the same include).  The
+builtin ``compact`` shader reads this layout.
+"""
+import numpy as np
+from numpy.lib import recfunctions
+
+from dent.Mesh import Mesh
+
+POSITION_FORMATS = ("float16", "snorm16")
+
+# Fields that shaders read as integers, rather than as (normalised) floats.
+INTEGER_FIELDS = ("bone_ids",)
+
+_OCTAHEDRAL_FIELDS = {
+    "normal": "normal_oct",
+    "tangent": "tangent_oct",
+    "bitangent": "bitangent_oct",
+}
+
+
+def octahedral_encode(vectors):
+    """Encodes unit vectors as pairs of normalised 16 bit integers.
+
+    The vector is projected onto the octahedron |x| + |y| + |z| = 1, whose lower
+    half is folded over the upper to unwrap it onto a square."""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    vectors = vectors / np.maximum(np.abs(vectors).sum(axis=1), 1e-30)[:, np.newaxis]
+    encoded = vectors[:, :2]
+    folded = (1 - np.abs(encoded[:, ::-1])) * np.where(encoded >= 0, 1., -1.)
+    encoded = np.where(vectors[:, 2:3] < 0, folded, encoded)
+    return np.round(np.clip(encoded, -1, 1) * 32767).astype(np.int16)
+
+
+def octahedral_decode(encoded):
+    """Decodes vectors encoded by `octahedral_encode`, as the shaders do."""
+    encoded = np.maximum(np.asarray(encoded, dtype=np.float64) / 32767, -1)
+    z = 1 - np.abs(encoded).sum(axis=1)
+    unfolded = (1 - np.abs(encoded[:, ::-1])) * np.where(encoded >= 0, 1., -1.)
+    xy = np.where(z[:, np.newaxis] < 0, unfolded, encoded)
+    vectors = np.concatenate([xy, z[:, np.newaxis]], axis=1)
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+def compact_dtype(dtype, position_format="float16"):
+    """The compact equivalent of a full vertex dtype."""
+    if position_format not in POSITION_FORMATS:
+        raise ValueError("Unknown position format {}".format(position_format))
+    fields = []
+    for name in dtype.names:
+        if name == "position":
+            base = np.float16 if position_format == "float16" else np.int16
+            fields.append(("position", base, 4))
+        elif name in _OCTAHEDRAL_FIELDS:
+            fields.append((_OCTAHEDRAL_FIELDS[name], np.int16, 2))
+        elif name == "textcoord":
+            fields.append(("textcoord", np.float16, 2))
+        elif name in ("bone_ids", "weights"):
+            fields.append((name, np.uint8, 4))
+        else:
+            fields.append((name, dtype[name].base, dtype[name].shape))
+    return np.dtype(fields)
+
+
+def compact_mesh(mesh, position_format="float16"):
+    """Returns a copy of a mesh with its vertices in the compact layout."""
+    data = np.zeros(
+        len(mesh.data), dtype=compact_dtype(mesh.data.dtype, position_format)
+    )
+    compacted = Mesh(mesh.name, mesh._transform, mesh.offset, mesh.directory)
+    compacted.material_name = mesh.material_name
+    compacted.indices = mesh.indices
+
+    for name in mesh.data.dtype.names:
+        values = mesh.data[name]
+        if name == "position":
+            if position_format == "float16":
+                data["position"][:, :3] = values
+                data["position"][:, 3] = 1
+            else:
+                low, high = values.min(axis=0), values.max(axis=0)
+                compacted.position_offset = (low + high) / 2
+                compacted.position_scale = np.maximum((high - low) / 2, 1e-30)
+                data["position"][:, :3] = np.round(
+                    (values - compacted.position_offset)
+                    / compacted.position_scale
+                    * 32767
+                )
+                data["position"][:, 3] = 32767
+        elif name in _OCTAHEDRAL_FIELDS:
+            data[_OCTAHEDRAL_FIELDS[name]] = octahedral_encode(values)
+        elif name == "bone_ids":
+            if len(values) and (values.min() < 0 or values.max() > 255):
+                raise ValueError("Bone IDs do not fit in a byte")
+            data["bone_ids"] = values
+        elif name == "weights":
+            data["weights"] = np.round(np.clip(values, 0, 1) * 255)
+        else:
+            data[name] = values
+    compacted.data = data
+    compacted.compute_bounds()
+    return compacted
+
+
+def pack_fields(data, names):
+    """Returns a tightly packed copy of structured vertex data with only the given
+    fields (in the order of `data`).
+
+    If every field is kept, `data` itself is returned."""
+    names = [name for name in data.dtype.names if name in names]
+    if len(names) == len(data.dtype.names):
+        return data
+    return recfunctions.repack_fields(data[names])
+
+
+def convert_fields(data, types):
+    """Returns structured vertex data whose fields all have one of the base `types`,
+    converting the fields of any other type (such as 64 bit floats) to 32 bit floats.
+
+    If every field already has one of the types, `data` itself is returned."""
+    fields = []
+    for name in data.dtype.names:
+        base = data.dtype[name].base
+        if base not in types:
+            base = np.dtype(np.float32)
+        fields.append((name, base, data.dtype[name].shape))
+    dtype = np.dtype(fields)
+    if dtype == data.dtype:
+        return data
+    converted = np.zeros(len(data), dtype=dtype)
+    for name in data.dtype.names:
+        converted[name] = data[name]
+    return converted